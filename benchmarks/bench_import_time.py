@@ -0,0 +1,59 @@
+"""Measure cold-start cost: importing each entry module and constructing Pipeline, in fresh interpreters.
+
+Also reports which heavy dependencies each step pulled in. Run from the repository root:
+
+    python -m benchmarks.bench_import_time [--repeat 5]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["langchain_openai", "langchain_core", "langchain_neo4j", "neo4j", "dotenv", "openai", "PIL"]
+
+STEPS = {
+    "import main": "import main",
+    "import modules.chat": "import modules.chat",
+    "Pipeline()": "import main; main.Pipeline()",
+}
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(statement, repeat):
+    samples, loaded = [], []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(statement=statement, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, check=True,
+        )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        loaded = result["loaded"]
+    return {"median_ms": statistics.median(samples) * 1000, "min_ms": min(samples) * 1000, "loaded": loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'step':<22} {'median ms':>10} {'min ms':>8}  heavy modules loaded")
+    for name, statement in STEPS.items():
+        try:
+            result = measure(statement, args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"{name:<22} failed: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"{name:<22} {result['median_ms']:>10.1f} {result['min_ms']:>8.1f}  {', '.join(result['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Offline benchmark for Pipeline, MedicineDataImporter and Neo4jQueryHandler.
+
+Uses FakeChatModel, RecordingDriver, FakeGraph and FakeQAChain instead of OpenAI and Neo4j, so it
+needs the project's Python dependencies but no services. Run from the repository root:
+
+    python -m benchmarks.bench_pipeline --sizes 1 100 10000 --latency 0.05 --concurrency 16
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fakes import FakeChatModel, FakeGraph, FakeQAChain, RecordingDriver
+from benchmarks.scenarios import SCENARIO_SIZES, details_record, generate
+from main import Pipeline
+from modules.chat import Neo4jQueryHandler
+from modules.rate_limit import LLMScheduler
+from modules.snapshot import SnapshotStore, write_snapshot
+
+# The fake model has no quota, so the benchmark measures the pipeline rather than the default rate limits
+UNTHROTTLED = LLMScheduler(requests_per_minute=10**9, tokens_per_minute=10**12, max_concurrency=1024)
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(pct):
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] * 1000
+
+    return {"p50_ms": at(50), "p95_ms": at(95), "p99_ms": at(99), "mean_ms": statistics.fmean(ordered) * 1000}
+
+
+def write_images(directory, count):
+    """Distinct placeholder files; the fake model never decodes them."""
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"medicine_{index}.png")
+        with open(path, "wb") as image_file:
+            image_file.write(b"\x89PNG\r\n\x1a\n" + index.to_bytes(8, "big") * 64)
+        paths.append(path)
+    return paths
+
+
+def build_pipeline(ocr_args, detailed_args, latency, driver):
+    llm = FakeChatModel({"MedicineOCRData": ocr_args, "MedicineDetailedInfo": detailed_args}, latency=latency)
+    pipeline = Pipeline(driver=driver, llm=llm, scheduler=UNTHROTTLED)
+    return pipeline, llm
+
+
+def bench_sequential(pipeline, driver, image_paths):
+    """Pipeline.run semantics, timing each stage separately."""
+    stages = {"ocr": [], "enrichment": [], "import": []}
+    driver.reset()
+    start = time.perf_counter()
+    for image_path in image_paths:
+        t0 = time.perf_counter()
+        medicine_info = pipeline.ocr_extractor.extract_medicine_info(image_path)
+        t1 = time.perf_counter()
+        medicine_data = pipeline.details_extractor.generate_medicine_info(medicine_info[0])
+        t2 = time.perf_counter()
+        pipeline.data_creator.import_medicine_data(medicine_data)
+        t3 = time.perf_counter()
+        stages["ocr"].append(t1 - t0)
+        stages["enrichment"].append(t2 - t1)
+        stages["import"].append(t3 - t2)
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput_per_s": len(image_paths) / elapsed,
+        "stages": {stage: percentiles(samples) for stage, samples in stages.items()},
+        "statements_per_medicine": driver.statements / len(image_paths),
+        "transactions": driver.transactions,
+    }
+
+
+def bench_concurrent(pipeline, driver, image_paths, concurrency):
+    driver.reset()
+    start = time.perf_counter()
+    results = pipeline.run_batch(image_paths, concurrency=concurrency)
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput_per_s": len(image_paths) / elapsed,
+        "errors": sum(1 for result in results if result["error"]),
+        "statements_per_medicine": driver.statements / len(image_paths),
+    }
+
+
+def bench_batch_import(importer, driver, detailed_args):
+    driver.reset()
+    payloads = [[{"name": "MedicineDetailedInfo", "args": args}] for args in detailed_args]
+    start = time.perf_counter()
+    importer.import_medicines_data(payloads)
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput_per_s": len(payloads) / elapsed,
+        "statements_per_medicine": driver.statements / len(payloads),
+        "transactions": driver.transactions,
+    }
+
+
+def bench_chat(detailed_args, latency, questions_per_medicine=3):
+    graph = FakeGraph(detailed_args)
+    qa_chain = FakeQAChain(latency=latency)
+    handler = Neo4jQueryHandler(graph=graph, chain=qa_chain, scheduler=UNTHROTTLED)
+
+    questions = []
+    for args in detailed_args[:100]:
+        questions += [
+            f"What is {args['brand_name']} used for?",
+            f"What are the side effects of {args['generic_name']}?",
+            f"Does {args['brand_name']} interact with {args['drug_interactions'][0]['drug_name']}?",
+        ][:questions_per_medicine]
+    questions += ["Which medicine is the cheapest?"] * max(1, len(questions) // 10)
+
+    samples = []
+    start = time.perf_counter()
+    for question in questions * 2:
+        t0 = time.perf_counter()
+        handler.query(question)
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput_per_s": len(samples) / elapsed,
+        "latency": percentiles(samples),
+        "chain_calls": qa_chain.calls,
+        "graph_queries": graph.queries,
+        "caches": handler.cache_stats(),
+    }
+
+
+def bench_snapshot(detailed_args, directory, lookups=10000):
+    """Export a snapshot of the scenario's medicines and time template lookups served from it."""
+    path = os.path.join(directory, "graph.snapshot")
+    start = time.perf_counter()
+    write_snapshot(path, [details_record(args) for args in detailed_args])
+    export_s = time.perf_counter() - start
+    start = time.perf_counter()
+    store = SnapshotStore(path)
+    load_s = time.perf_counter() - start
+
+    intents = ["uses", "side_effects", "interactions", "dosage"]
+    samples = []
+    for index in range(lookups):
+        params = {"name": detailed_args[index % len(detailed_args)]["brand_name"].lower()}
+        t0 = time.perf_counter()
+        store.template_rows(intents[index % len(intents)], params)
+        samples.append(time.perf_counter() - t0)
+    return {
+        "export_ms": export_s * 1000,
+        "load_ms": load_s * 1000,
+        "file_bytes": os.path.getsize(path),
+        "lookup": percentiles(samples),
+    }
+
+
+def run_scenario(size, latency, concurrency, trace_memory):
+    ocr_args, detailed_args = generate(size)
+    driver = RecordingDriver()
+    report = {"medicines": size}
+    if trace_memory:
+        tracemalloc.start()
+    with tempfile.TemporaryDirectory() as directory:
+        image_paths = write_images(directory, size)
+        pipeline, llm = build_pipeline(ocr_args, detailed_args, latency, driver)
+        report["sequential"] = bench_sequential(pipeline, driver, image_paths)
+        pipeline, llm = build_pipeline(ocr_args, detailed_args, latency, driver)
+        report["concurrent"] = bench_concurrent(pipeline, driver, image_paths, concurrency)
+        report["batch_import"] = bench_batch_import(pipeline.data_creator, driver, detailed_args)
+        report["snapshot"] = bench_snapshot(detailed_args, directory)
+    report["chat"] = bench_chat(detailed_args, latency)
+    if trace_memory:
+        report["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return report
+
+
+def print_report(report):
+    print(f"\n== {report['medicines']} medicines ==")
+    sequential = report["sequential"]
+    print(f"sequential pipeline: {sequential['throughput_per_s']:.1f} medicines/s, "
+          f"{sequential['statements_per_medicine']:.1f} statements/medicine")
+    for stage, stats in sequential["stages"].items():
+        print(f"  {stage:<11} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  "
+              f"p99 {stats['p99_ms']:8.2f} ms")
+    concurrent = report["concurrent"]
+    print(f"concurrent pipeline: {concurrent['throughput_per_s']:.1f} medicines/s, {concurrent['errors']} errors")
+    batch = report["batch_import"]
+    print(f"batched import: {batch['throughput_per_s']:.1f} medicines/s, "
+          f"{batch['statements_per_medicine']:.3f} statements/medicine in {batch['transactions']} transactions")
+    chat_report = report["chat"]
+    print(f"chat: {chat_report['throughput_per_s']:.1f} questions/s, p50 {chat_report['latency']['p50_ms']:.2f} ms, "
+          f"p99 {chat_report['latency']['p99_ms']:.2f} ms, {chat_report['chain_calls']} chain calls")
+    snapshot = report["snapshot"]
+    print(f"snapshot: {snapshot['file_bytes']} bytes, export {snapshot['export_ms']:.1f} ms, "
+          f"load {snapshot['load_ms']:.1f} ms, lookup p50 {snapshot['lookup']['p50_ms'] * 1000:.1f} us, "
+          f"p99 {snapshot['lookup']['p99_ms'] * 1000:.1f} us")
+    if "peak_memory_mb" in report:
+        print(f"peak memory: {report['peak_memory_mb']:.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SCENARIO_SIZES))
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per LLM call")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (it slows the run down)")
+    parser.add_argument("--json", help="also write the reports to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    reports = [run_scenario(size, args.latency, args.concurrency, not args.no_memory) for size in args.sizes]
+    for report in reports:
+        print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as report_file:
+            json.dump(reports, report_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
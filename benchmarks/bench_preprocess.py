@@ -0,0 +1,38 @@
+"""Benchmark image preprocessing against test_data/dolo.jpg.
+
+Run from the repository root: python -m benchmarks.bench_preprocess [image_path]
+"""
+import base64
+import sys
+import time
+
+from modules.image_preprocess import ImagePreprocessor, detect_mime_type
+
+SETTINGS = [
+    {"max_edge": 2048, "quality": 90},
+    {"max_edge": 1568, "quality": 85},
+    {"max_edge": 1024, "quality": 80},
+    {"max_edge": 1024, "quality": 80, "grayscale": True},
+    {"max_edge": 1024, "quality": 80, "crop_to_label": True},
+]
+
+
+def main(image_path="test_data/dolo.jpg", repeat=5):
+    with open(image_path, "rb") as image_file:
+        image_bytes = image_file.read()
+    original_b64 = len(base64.b64encode(image_bytes))
+    print(f"{image_path}: {len(image_bytes)} bytes ({detect_mime_type(image_bytes)}), {original_b64} base64 bytes")
+    print(f"{'settings':<60} {'bytes':>10} {'saved':>8} {'ms':>8}")
+
+    for settings in SETTINGS:
+        preprocessor = ImagePreprocessor(**settings)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = preprocessor.process(image_bytes)
+        elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+        saved = 100 * result.bytes_saved / result.original_bytes
+        print(f"{str(settings):<60} {result.processed_bytes:>10} {saved:>7.1f}% {elapsed_ms:>8.1f}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
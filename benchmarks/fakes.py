@@ -0,0 +1,191 @@
+"""Local stand-ins for the OpenAI chat model and the Neo4j driver used by the benchmarks."""
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class FakeResponse:
+    tool_calls: list
+    usage_metadata: dict = field(default_factory=dict)
+
+
+class FakeChatModel:
+    """Replays recorded tool calls with a fixed latency.
+
+    ``responses`` maps a tool schema name (e.g. "MedicineOCRData") to a list of tool-call args
+    dicts; each call returns the next one for the tool bound with bind_tools, cycling when exhausted.
+    """
+
+    def __init__(self, responses, latency=0.0, prompt_tokens=800, completion_tokens=300):
+        self.latency = latency
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.calls = 0
+        self._responses = {name: itertools.cycle(args_list) for name, args_list in responses.items()}
+
+    def bind_tools(self, tools):
+        return _BoundFakeChatModel(self, tools[0].__name__)
+
+    def respond(self, tool_name):
+        self.calls += 1
+        return FakeResponse(
+            tool_calls=[{"name": tool_name, "args": next(self._responses[tool_name]),
+                         "id": f"call_{self.calls}", "type": "tool_call"}],
+            usage_metadata={
+                "input_tokens": self.prompt_tokens,
+                "output_tokens": self.completion_tokens,
+                "total_tokens": self.prompt_tokens + self.completion_tokens,
+            },
+        )
+
+
+class _BoundFakeChatModel:
+    def __init__(self, model, tool_name):
+        self.model = model
+        self.tool_name = tool_name
+
+    def invoke(self, messages):
+        if self.model.latency:
+            time.sleep(self.model.latency)
+        return self.model.respond(self.tool_name)
+
+    async def ainvoke(self, messages):
+        if self.model.latency:
+            await asyncio.sleep(self.model.latency)
+        return self.model.respond(self.tool_name)
+
+
+class FakeGraph:
+    """In-memory Neo4jGraph stand-in answering the chat templates from MedicineDetailedInfo args."""
+
+    def __init__(self, medicines, latency=0.0):
+        self.latency = latency
+        self.queries = 0
+        self.schema = ""
+        self.structured_schema = {}
+        self.medicines = {}
+        for args in medicines:
+            for key in ("brand_name", "generic_name"):
+                self.medicines[args[key].lower()] = args
+
+    @property
+    def get_schema(self):
+        return self.schema
+
+    def refresh_schema(self):
+        pass
+
+    def query(self, query, params=None):
+        self.queries += 1
+        if self.latency:
+            time.sleep(self.latency)
+        params = params or {}
+        if "db.labels" in query or "relationshipTypes" in query or "propertyKeys" in query or "UNION ALL" in query:
+            return []
+        if "UNION" in query:
+            return [{"name": name} for name in self.medicines]
+        args = self.medicines.get(params.get("name"))
+        if args is None:
+            return []
+        medicine = args["brand_name"]
+        if "USED_FOR" in query:
+            return [{"medicine": medicine, "use": use} for use in args["uses"]]
+        if "INTERACTS_WITH" in query:
+            return [{"medicine": medicine, **interaction} for interaction in args["drug_interactions"]
+                    if "other" not in params or interaction["drug_name"].lower() == params["other"]]
+        if "MAY_CAUSE]->(se" in query:
+            return [{"medicine": medicine, "side_effect": effect} for effect in args["side_effects"]]
+        return []
+
+
+class FakeQAChain:
+    """GraphCypherQAChain stand-in: one call costs two LLM latencies (Cypher generation and answer)."""
+
+    top_k = 10
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.qa_chain = self
+
+    def invoke(self, inputs, config=None):
+        self.calls += 1
+        if "query" in inputs:
+            time.sleep(2 * self.latency)
+            return {
+                "query": inputs["query"],
+                "result": "I don't know the answer.",
+                "intermediate_steps": [{"query": "MATCH (m:Medicine) RETURN count(m)"}, {"context": []}],
+            }
+        time.sleep(self.latency)
+        return "I don't know the answer."
+
+
+class FakeResult(list):
+    def consume(self):
+        return None
+
+    def single(self):
+        return self[0] if self else None
+
+
+class RecordingTransaction:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def run(self, query, parameters=None, **kwargs):
+        self.driver.record(query, {**(parameters or {}), **kwargs})
+        return FakeResult(self.driver.responder(query, {**(parameters or {}), **kwargs}))
+
+
+class RecordingSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        pass
+
+    def _transaction(self, work, *args, **kwargs):
+        self.driver.transactions += 1
+        return work(RecordingTransaction(self.driver), *args, **kwargs)
+
+    execute_write = _transaction
+    execute_read = _transaction
+
+    def run(self, query, parameters=None, **kwargs):
+        self.driver.transactions += 1
+        return RecordingTransaction(self.driver).run(query, parameters, **kwargs)
+
+
+class RecordingDriver:
+    """Neo4j driver stand-in that counts statements (each a Bolt round trip), rows sent and transactions.
+
+    ``responder(query, params)`` supplies the records returned for each statement (none by default).
+    """
+
+    def __init__(self, responder=None):
+        self.responder = responder or (lambda query, params: [])
+        self.reset()
+
+    def reset(self):
+        self.statements = 0
+        self.transactions = 0
+        self.rows_sent = 0
+
+    def record(self, query, params):
+        self.statements += 1
+        self.rows_sent += len(params.get("rows", ())) or 1
+
+    def session(self, **kwargs):
+        return RecordingSession(self)
+
+    def close(self):
+        pass
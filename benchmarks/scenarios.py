@@ -0,0 +1,75 @@
+"""Synthetic MedicineOCRData / MedicineDetailedInfo payloads for benchmark scenarios."""
+import random
+
+SCENARIO_SIZES = (1, 100, 10000)
+
+_USES = ["Fever", "Headache", "Body pain", "Toothache", "Cold", "Arthritis", "Migraine", "Back pain"]
+_SIDE_EFFECTS = ["Nausea", "Rash", "Dizziness", "Drowsiness", "Stomach upset", "Dry mouth"]
+_INTERACTING = ["Warfarin", "Alcohol", "Isoniazid", "Ibuprofen", "Aspirin", "Rifampicin"]
+_STORAGE = ["Store below 30°C", "Protect from light", "Keep in a dry place"]
+
+
+def synthetic_medicine(index, seed=0):
+    """Return (ocr_args, detailed_args) for the ``index``-th synthetic medicine."""
+    rng = random.Random(seed * 1_000_003 + index)
+    generic_name = f"Genericol-{index}"
+    strength = rng.choice([250, 325, 500, 650])
+    ingredients = [{"name": generic_name, "composition_mg": float(strength)}]
+    if rng.random() < 0.3:
+        ingredients.append({"name": f"Adjuvant-{index % 50}", "composition_mg": float(rng.choice([5, 10, 25]))})
+    storage = {"storage_conditions": rng.sample(_STORAGE, 2), "shelf_life": f"{rng.randint(1, 3)} years"}
+
+    ocr_args = {
+        "generic_name": generic_name,
+        "brand_name": f"Brandex-{index}",
+        "manufacturer": f"Labs {index % 20}",
+        "power_mg": str(strength),
+        "ingredients": ingredients,
+        "storage_and_shelf_life": storage,
+    }
+    detailed_args = {
+        **ocr_args,
+        "uses": rng.sample(_USES, 3),
+        "dosage_guidelines": {
+            "max_daily_dosage": f"{strength * 6} mg",
+            "overdose_effects": ["Liver damage", "Vomiting"],
+        },
+        "administration_instructions": {"with_what_to_take": ["Water"], "before_or_after_food": "After food"},
+        "mechanism_of_action": {
+            "description": f"Inhibits pathway {index % 7}",
+            "detailed_steps": [f"Step {step} of pathway {index % 7}" for step in range(3)],
+        },
+        "side_effects": rng.sample(_SIDE_EFFECTS, 3),
+        "drug_interactions": [
+            {"drug_name": drug, "interaction_type": "antagonistic", "effects": f"Altered effect of {drug}"}
+            for drug in rng.sample(_INTERACTING, 2)
+        ],
+    }
+    return ocr_args, detailed_args
+
+
+def generate(count, seed=0):
+    """Return parallel lists of OCR args and detailed args for ``count`` medicines."""
+    pairs = [synthetic_medicine(index, seed) for index in range(count)]
+    return [ocr for ocr, _ in pairs], [detailed for _, detailed in pairs]
+
+
+def details_record(args):
+    """The row ALL_MEDICINE_DETAILS_QUERY would return for a medicine imported from ``args``."""
+    administration = args["administration_instructions"]
+    storage = args["storage_and_shelf_life"]
+    return {
+        "medicine": {key: args.get(key) for key in ("generic_name", "brand_name", "manufacturer", "power_mg")},
+        "ingredients": args["ingredients"],
+        "uses": args["uses"],
+        "max_daily_dosage": args["dosage_guidelines"]["max_daily_dosage"],
+        "overdose_effects": args["dosage_guidelines"]["overdose_effects"],
+        "with_what_to_take": [administration["with_what_to_take"]],
+        "before_or_after_food": [administration["before_or_after_food"]],
+        "mechanism_description": args["mechanism_of_action"]["description"],
+        "detailed_steps": args["mechanism_of_action"]["detailed_steps"],
+        "side_effects": args["side_effects"],
+        "drug_interactions": args["drug_interactions"],
+        "storage_conditions": storage["storage_conditions"],
+        "shelf_life": [storage["shelf_life"]],
+    }
@@ -1,39 +1,217 @@
+from modules import cache
 from modules import data_create
 from modules import details_data
+from modules import image_preprocess
+from modules import metrics as metrics_module
 from modules import ocr_data
+from modules import rate_limit
+from modules import streaming
+import argparse
+import asyncio
+import json
+import logging
 import os
+import threading
+
+_ENVIRONMENT_LOADED = False
+
+
+def load_environment():
+    """Load .env into os.environ once. Deferred to first use so importing main stays cheap."""
+    global _ENVIRONMENT_LOADED
+    if not _ENVIRONMENT_LOADED:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _ENVIRONMENT_LOADED = True
 
-NEO4J_USERNAME = os.getenv("NEO4J_USERNAME")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
-NEO4J_URI = os.getenv("NEO4J_URI")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 class Pipeline:
-    def __init__(self):
-        self.ocr_extractor = ocr_data.MedicineOCRExtractor(api_key=OPENAI_API_KEY)
-        self.details_extractor = details_data.MedicineInfoGenerator(api_key=OPENAI_API_KEY)
-        self.data_creator = data_create.MedicineDataImporter(NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD)
+    def __init__(self, metrics=None, driver=None, llm=None, scheduler=None):
+        """``metrics`` is the MetricsRegistry every stage records into, the shared REGISTRY by default.
+
+        ``driver`` (a Neo4j driver) and ``llm`` (a chat model) are shared by every stage when given.
+        Stages, and the clients they need, are only built the first time they are used, so a caller
+        that only needs OCR never connects to Neo4j.
+        """
+        load_environment()
+        self.metrics = metrics or metrics_module.REGISTRY
+        self.driver = driver
+        self.llm = llm
+        self.scheduler = scheduler or rate_limit.SCHEDULER
+        requests_per_minute = os.getenv("OPENAI_REQUESTS_PER_MINUTE")
+        tokens_per_minute = os.getenv("OPENAI_TOKENS_PER_MINUTE")
+        if scheduler is None and (requests_per_minute or tokens_per_minute):
+            self.scheduler = rate_limit.LLMScheduler(
+                requests_per_minute=int(requests_per_minute or 500),
+                tokens_per_minute=int(tokens_per_minute or 200000),
+                metrics=self.metrics,
+            )
+        self._ocr_extractor = None
+        self._data_creator = None
+        self._details_extractor = None
+        self._stage_lock = threading.Lock()
+
+    @property
+    def ocr_extractor(self):
+        if self._ocr_extractor is None:
+            with self._stage_lock:
+                if self._ocr_extractor is None:
+                    ocr_cache_path = os.getenv("OCR_CACHE_PATH")
+                    max_image_edge = os.getenv("OCR_MAX_IMAGE_EDGE")
+                    preprocessor = image_preprocess.ImagePreprocessor(max_edge=int(max_image_edge)) if max_image_edge else None
+                    self._ocr_extractor = ocr_data.MedicineOCRExtractor(
+                        api_key=os.getenv("OPENAI_API_KEY"),
+                        cache=cache.SQLiteCache(ocr_cache_path) if ocr_cache_path else None,
+                        preprocessor=preprocessor,
+                        metrics=self.metrics,
+                        scheduler=self.scheduler,
+                        llm=self.llm,
+                    )
+        return self._ocr_extractor
+
+    @property
+    def data_creator(self):
+        if self._data_creator is None:
+            with self._stage_lock:
+                if self._data_creator is None:
+                    self._data_creator = data_create.MedicineDataImporter(
+                        os.getenv("NEO4J_URI"), os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD"),
+                        metrics=self.metrics, driver=self.driver,
+                        snapshot_path=os.getenv("GRAPH_SNAPSHOT_PATH"),
+                    )
+                    self._data_creator.ensure_schema()
+        return self._data_creator
+
+    async def adata_creator(self):
+        """data_creator for async callers: its first access bootstraps the schema (a backfill scan and
+        up to minutes of index population), so it is built on a worker thread instead of the event loop."""
+        if self._data_creator is None:
+            return await asyncio.to_thread(lambda: self.data_creator)
+        return self._data_creator
+
+    @property
+    def details_extractor(self):
+        if self._details_extractor is None:
+            with self._stage_lock:
+                if self._details_extractor is None:
+                    details_cache_path = os.getenv("DETAILS_CACHE_PATH")
+                    self._details_extractor = details_data.MedicineInfoGenerator(
+                        api_key=os.getenv("OPENAI_API_KEY"),
+                        cache=cache.SQLiteCache(details_cache_path) if details_cache_path else None,
+                        # Resolved per call so building this stage does not build the import stage
+                        graph_lookup=lambda generic_name: self.data_creator.find_medicine_data(generic_name),
+                        metrics=self.metrics,
+                        scheduler=self.scheduler,
+                        llm=self.llm,
+                    )
+        return self._details_extractor
 
     def run(self, image_path):
-        medicine_info = self.ocr_extractor.extract_medicine_info(image_path)
-        if not medicine_info:
-            return
-        medicine_info=medicine_info[0]
-        medicine_data = self.details_extractor.generate_medicine_info(medicine_info)
-        if not medicine_data:
-            return
-        print("Medicine Data: ", medicine_data)
-        self.data_creator.import_medicine_data(medicine_data)
-        
+        """Extract, enrich and import one medicine. ``image_path`` may be a list of photos of one package."""
+        with self.metrics.timer("pipeline", image_path=str(image_path)):
+            tool_calls = self.ocr_extractor.extract_medicine_info(image_path)
+            medicine_info = ocr_data.package_ocr_data(image_path, tool_calls)
+            if not medicine_info:
+                return
+            medicine_info=medicine_info[0]
+            medicine_data = self.details_extractor.generate_medicine_info(medicine_info)
+            if not medicine_data:
+                return
+            logging.debug(f"Medicine Data: {medicine_data}")
+            self.data_creator.import_medicine_data(medicine_data)
+
+        return medicine_data
+
+    async def arun(self, image_path):
+        """Async counterpart of run. Raises RuntimeError naming the stage that failed and why."""
+        with self.metrics.timer("pipeline", image_path=str(image_path)):
+            try:
+                tool_calls = await self.ocr_extractor.aextract_medicine_info(image_path, raise_errors=True)
+            except Exception as e:
+                raise RuntimeError(f"OCR extraction failed: {e}") from e
+            medicine_info = ocr_data.package_ocr_data(image_path, tool_calls)
+            if not medicine_info:
+                raise RuntimeError("OCR extraction returned no result")
+            try:
+                medicine_data = await self.details_extractor.agenerate_medicine_info(medicine_info[0], raise_errors=True)
+            except Exception as e:
+                raise RuntimeError(f"Detail generation failed: {e}") from e
+            if not medicine_data:
+                raise RuntimeError("Detail generation returned no result")
+            data_creator = await self.adata_creator()
+            await asyncio.to_thread(data_creator.import_medicine_data, medicine_data)
+
         return medicine_data
+
+    async def arun_batch(self, image_paths, concurrency=8):
+        """Run the pipeline over many images with at most ``concurrency`` images in flight.
+
+        Returns one dict per image, in input order, with ``image_path``, ``result`` and ``error``.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_one(image_path):
+            async with semaphore:
+                try:
+                    return {"image_path": image_path, "result": await self.arun(image_path), "error": None}
+                except Exception as e:
+                    return {"image_path": image_path, "result": None, "error": str(e)}
+
+        # One snapshot export for the whole batch rather than one per image
+        data_creator = await self.adata_creator()
+        with data_creator.deferred_snapshot():
+            return await asyncio.gather(*(run_one(image_path) for image_path in image_paths))
+
+    def run_batch(self, image_paths, concurrency=8):
+        """Synchronous wrapper around arun_batch."""
+        return asyncio.run(self.arun_batch(image_paths, concurrency=concurrency))
     
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract, enrich and import medicines from package photos.")
+    parser.add_argument("images", nargs="*", help="image paths to process (default: test_data/dolo.jpg)")
+    parser.add_argument("--watch", metavar="DIR", help="stream images from a watched directory")
+    parser.add_argument("--jsonl", metavar="FILE", help="stream image paths from a JSONL queue")
+    parser.add_argument("--follow", action="store_true", help="keep tailing the JSONL queue for new lines")
+    parser.add_argument("--stdin", action="store_true", help="stream image paths from standard input")
+    parser.add_argument("--workers", type=int, default=4, help="OCR and enrichment workers in streaming mode")
+    parser.add_argument("--import-batch-size", type=int, default=50)
+    parser.add_argument("--same-package", action="store_true",
+                        help="treat the images as photos of one package and extract them in a single request")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = parse_args()
     pipeline = Pipeline()
-    image_path = "test_data/dolo.jpg"
-    result = pipeline.run(image_path)
-    print(result)
-    
-    if result:
-        print(result)
+
+    if args.watch or args.jsonl or args.stdin:
+        if args.watch:
+            source = streaming.watch_directory(args.watch)
+        elif args.jsonl:
+            source = streaming.read_jsonl(args.jsonl, follow=args.follow)
+        else:
+            source = streaming.read_stdin()
+        streamer = streaming.StreamingPipeline(
+            pipeline,
+            ocr_workers=args.workers,
+            enrichment_workers=args.workers,
+            import_batch_size=args.import_batch_size,
+            on_result=lambda result: print(json.dumps(result, default=str)),
+        )
+        processed, failed = asyncio.run(streamer.run(source))
+        print(f"Processed {processed} images, {failed} failed.")
+    elif args.same_package and args.images:
+        result = pipeline.run(args.images)
+        print(result if result else "Failed to generate detailed medicine information.")
+    elif len(args.images) > 1:
+        for result in pipeline.run_batch(args.images, concurrency=args.workers):
+            print(json.dumps(result, default=str))
     else:
-        print("Failed to generate detailed medicine information.")
+        image_path = args.images[0] if args.images else "test_data/dolo.jpg"
+        result = pipeline.run(image_path)
+
+        if result:
+            print(result)
+        else:
+            print("Failed to generate detailed medicine information.")
@@ -1,44 +1,321 @@
+import json
 import logging
-from langchain_neo4j import GraphCypherQAChain, Neo4jGraph
-from langchain_openai import ChatOpenAI
+import re
 import os
+import threading
+import time
+from .cache import LRUCache
+from .metrics import REGISTRY
+from .rate_limit import INTERACTIVE, SCHEDULER, estimate_tokens
+from .cypher_templates import KNOWN_NAMES_QUERY, CypherTemplateRouter
+from .interactions import InteractionChecker
+from .schema_cache import SchemaSnapshotCache, drifted_names, graph_fingerprint, resample_schema
+
+# Medicines whose import committed after $since (database clock, ms); MedicineDataImporter sets imported_at
+RECENT_IMPORTS_QUERY = """
+MATCH (m:Medicine)
+WHERE m.imported_at > $since
+RETURN m.brand_name_lower AS brand_name, m.generic_name_lower AS generic_name, m.imported_at AS imported_at
+"""
+
+# imported_at is stamped when the statement runs, not at commit, so each poll re-reads this much history
+IMPORT_POLL_OVERLAP_MS = 60000
+
+
+def normalise_question(question):
+    """Case-fold, drop punctuation and collapse whitespace so near-identical questions share cache entries."""
+    return " ".join(re.sub(r"[^\w\s-]", " ", question.casefold()).split())
+
 
 class Neo4jQueryHandler:
-    def __init__(self, neo4j_url, neo4j_username, neo4j_password, openai_api_key):
+    def __init__(self, neo4j_url=None, neo4j_username=None, neo4j_password=None, openai_api_key=None,
+                 cache_size=1024, cache_ttl=3600, schema_cache_path=None, metrics=None,
+                 scheduler=None, interaction_index=False, graph=None, llm=None, chain=None, snapshot=None,
+                 import_poll_interval=5.0):
+        """``cache_size`` and ``cache_ttl`` bound both the question -> Cypher and the Cypher+params -> result caches.
+
+        ``schema_cache_path`` persists the sampled enhanced schema so later processes can skip sampling.
+        ``metrics`` is the MetricsRegistry to record into, the shared REGISTRY by default.
+        LLM calls go through ``scheduler`` (the shared LLMScheduler by default) in its interactive lane.
+        ``interaction_index`` keeps every medicine's interactions in memory for check_interactions.
+        ``graph``, ``llm`` and ``chain`` inject an existing Neo4jGraph, chat model or QA chain instead
+        of connecting with the credentials above. The chain and its model are only built when a
+        question first falls through to it.
+        ``snapshot`` is an optional SnapshotStore; template questions are then answered from it
+        without a round trip to Neo4j.
+
+        Cached results are invalidated when medicines are imported: immediately through on_import when
+        it is registered with the importer in the same process, and otherwise by poll_imports, which
+        query() runs at most every ``import_poll_interval`` seconds (None disables it). Changes made
+        without MedicineDataImporter are only picked up when ``cache_ttl`` expires.
+        """
 
-        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger(__name__)
+        self.metrics = metrics or REGISTRY
+        self.scheduler = scheduler or SCHEDULER
+        self.llm = llm
+        self._chain = chain
+        self.snapshot = snapshot
 
-        if "OPENAI_API_KEY" not in os.environ:
+        if openai_api_key and "OPENAI_API_KEY" not in os.environ:
             os.environ["OPENAI_API_KEY"] = openai_api_key
-        
-        self.logger.info("Initializing Neo4jGraph connection")
-        self.enhanced_graph = Neo4jGraph(
-            url=neo4j_url,
-            username=neo4j_username,
-            password=neo4j_password,
-            enhanced_schema=True,
-        )
-        
-        self.logger.info("Neo4jGraph connection established")
+
+        if graph is None:
+            from langchain_neo4j import Neo4jGraph
+
+            self.logger.info("Initializing Neo4jGraph connection")
+            graph = Neo4jGraph(
+                url=neo4j_url,
+                username=neo4j_username,
+                password=neo4j_password,
+                enhanced_schema=True,
+                refresh_schema=False,
+            )
+            self.logger.info("Neo4jGraph connection established")
+        self.enhanced_graph = graph
+
+        self.schema_cache = SchemaSnapshotCache(schema_cache_path) if schema_cache_path else None
+        self.schema_fingerprint = None
+        self.load_schema()
         self.logger.debug(f"Graph schema: {self.enhanced_graph.schema}")
-        
-        self.logger.info("Refreshing graph schema")
-        self.enhanced_graph.refresh_schema()
-        
-        self.logger.info("Initializing GraphCypherQAChain")
-        self.chain = GraphCypherQAChain.from_llm(
-            ChatOpenAI(temperature=0),
-            graph=self.enhanced_graph,
-            verbose=True,
-            allow_dangerous_requests=True
+
+        self.router = CypherTemplateRouter()
+        self.refresh_entities()
+        self.interactions = InteractionChecker(
+            self.enhanced_graph.query, use_index=interaction_index, metrics=self.metrics
         )
-        self.logger.info("GraphCypherQAChain initialized")
+
+        self.cypher_cache = LRUCache(max_entries=cache_size, ttl=cache_ttl)
+        self.result_cache = LRUCache(max_entries=cache_size, ttl=cache_ttl)
+
+        self.import_poll_interval = import_poll_interval
+        self._poll_lock = threading.Lock()
+        self._polled_at = time.monotonic()
+        self._seen_imports = set()
+        rows = self.enhanced_graph.query("RETURN timestamp() AS now")
+        self._import_watermark = rows[0]["now"] if rows else 0
+
+    @property
+    def chain(self):
+        if self._chain is None:
+            from langchain_neo4j import GraphCypherQAChain
+
+            if self.llm is None:
+                from langchain_openai import ChatOpenAI
+                self.llm = ChatOpenAI(temperature=0, max_retries=0)
+            self.logger.info("Initializing GraphCypherQAChain")
+            self._chain = GraphCypherQAChain.from_llm(
+                self.llm,
+                graph=self.enhanced_graph,
+                verbose=True,
+                allow_dangerous_requests=True,
+                return_intermediate_steps=True,
+            )
+            self.logger.info("GraphCypherQAChain initialized")
+        return self._chain
+
+    def load_schema(self, force=False):
+        """Use the cached schema snapshot if the graph fingerprint is compatible, otherwise sample the graph."""
+        fingerprint = graph_fingerprint(self.enhanced_graph)
+        snapshot = self.schema_cache.load() if self.schema_cache and not force else None
+        if snapshot and self.schema_cache.is_compatible(snapshot["fingerprint"], fingerprint):
+            self.logger.info("Using cached graph schema snapshot")
+            self.enhanced_graph.structured_schema = snapshot["structured_schema"]
+            self.enhanced_graph.schema = snapshot["schema"]
+            self.schema_fingerprint = snapshot["fingerprint"]
+        else:
+            self.logger.info("Refreshing graph schema")
+            self.enhanced_graph.refresh_schema()
+            self.schema_fingerprint = fingerprint
+            if self.schema_cache:
+                self.schema_cache.save(fingerprint, self.enhanced_graph.structured_schema, self.enhanced_graph.schema)
+
+    def refresh_schema_if_changed(self):
+        """Re-sample the schema only if the graph has drifted from the fingerprint it was sampled at.
+
+        When only counts drifted, just the drifted labels and relationship types are re-sampled; new
+        labels, types or property keys re-sample the whole schema.
+        """
+        max_drift = self.schema_cache.max_drift if self.schema_cache else 0.1
+        fingerprint = graph_fingerprint(self.enhanced_graph)
+        drifted = drifted_names(self.schema_fingerprint, fingerprint, max_drift)
+        if drifted is not None and not any(drifted.values()):
+            return False
+        if drifted is not None and resample_schema(self.enhanced_graph, drifted, fingerprint):
+            self.logger.info(f"Re-sampled graph schema of {', '.join(drifted['labels'] + drifted['relationships'])}")
+            # Other counts keep the value they were sampled at, so slow drift still triggers a re-sample
+            for bucket, names in drifted.items():
+                for name in names:
+                    self.schema_fingerprint[bucket][name] = fingerprint[bucket][name]
+            if self.schema_cache:
+                self.schema_cache.save(
+                    self.schema_fingerprint, self.enhanced_graph.structured_schema, self.enhanced_graph.schema
+                )
+        else:
+            self.load_schema(force=True)
+        if self._chain is not None:
+            self._chain.graph_schema = self.enhanced_graph.get_schema
+        return True
+
+    def on_import(self, names):
+        """Import listener: invalidate cached results for ``names`` and refresh the schema if it changed."""
+        if self.snapshot is not None:
+            self.snapshot.on_import(names)
+        self.invalidate_medicines(names)
+        self.interactions.on_import(names)
+        self.refresh_schema_if_changed()
+
+    def poll_imports(self):
+        """Run on_import for medicines imported by any process since the last poll; returns their names."""
+        if not self._poll_lock.acquire(blocking=False):
+            return set()
+        try:
+            self._polled_at = time.monotonic()
+            rows = self.enhanced_graph.query(
+                RECENT_IMPORTS_QUERY, params={"since": self._import_watermark - IMPORT_POLL_OVERLAP_MS}
+            )
+            seen = {(row["brand_name"], row["imported_at"]) for row in rows}
+            names = {row[key] for row in rows if (row["brand_name"], row["imported_at"]) not in self._seen_imports
+                     for key in ("brand_name", "generic_name") if row[key]}
+            self._seen_imports = seen
+            if rows:
+                self._import_watermark = max(self._import_watermark, max(row["imported_at"] for row in rows))
+        finally:
+            self._poll_lock.release()
+        if names:
+            self.logger.info(f"Picked up imports of {len(names)} names from the graph")
+            self.on_import(names)
+        return names
+
+    def cache_stats(self):
+        return {"cypher": self.cypher_cache.stats(), "result": self.result_cache.stats()}
+
+    def invalidate_medicines(self, names):
+        """Drop cached results mentioning any of ``names``, plus results not tied to a known medicine.
+
+        Called from on_import, which can be registered with MedicineDataImporter.add_import_listener
+        or is run by poll_imports for imports made by other processes.
+        """
+        names = {name.lower() for name in names}
+        self.router.add_names(names)
+        dropped = self.result_cache.invalidate(
+            lambda key, entry: not entry["names"] or bool(entry["names"] & names)
+        )
+        self.logger.info(f"Invalidated {dropped} cached results after import of {len(names)} names")
+
+    def _cached_rows(self, cypher, params, run):
+        """Return the result cache entry for ``cypher`` and ``params``, running ``run()`` on a miss."""
+        key = (cypher, json.dumps(params, sort_keys=True, default=str))
+        entry = self.result_cache.get(key)
+        self.metrics.record_cache("chat_result", entry is not None)
+        if entry is None:
+            rows = run()
+            text = json.dumps([cypher, params, rows], default=str)
+            entry = {"rows": rows, "names": set(self.router.find_entities(text)), "answers": {}}
+            self.result_cache.set(key, entry)
+        return entry
+
+    def refresh_entities(self):
+        """Reload the medicine and interacting-drug names the template router recognises."""
+        names = [record["name"] for record in self.enhanced_graph.query(KNOWN_NAMES_QUERY)]
+        self.router.refresh_names(names)
+        self.logger.info(f"Template router loaded {len(names)} entity names")
+
+    def _query_template(self, question):
+        """Answer a recognised question shape with parameterised Cypher, or return None to fall back."""
+        routed = self.router.route(question)
+        if routed is None:
+            return None
+        template, params = routed
+        # A medicine missing from the snapshot may have been imported since it was exported
+        snapshot = self.snapshot.snapshot if self.snapshot is not None else None
+        rows = None
+        if snapshot is not None and snapshot.lookup(params["name"]):
+            rows = snapshot.template_rows(template.intent, params)
+        if rows is None:
+            rows = self._cached_rows(
+                template.cypher, params, lambda: self.enhanced_graph.query(template.cypher, params=params)
+            )["rows"]
+        else:
+            self.metrics.inc("pillbuddy_snapshot_queries_total", intent=template.intent)
+        if not rows:
+            self.logger.info(f"Template {template.intent} matched but returned no rows")
+            return None
+        self.logger.info(f"Query answered by template {template.intent}")
+        self.metrics.inc("pillbuddy_chat_queries_total", route="template")
+        return {"query": question, "result": template.format(rows, params)}
+
+    def _invoke_llm(self, runnable, inputs):
+        """Invoke an LLM-backed runnable through the scheduler, recording token usage when available.
+
+        The scheduler sees the whole runnable as one request holding one slot. For the full
+        GraphCypherQAChain that is two LLM calls (Cypher generation and answer) plus the graph query,
+        so it is admitted, rate-limited and estimated as a single call, and a retried rate-limit or
+        transient error re-runs the Cypher query as well.
+        """
+        tokens = estimate_tokens(inputs, completion_tokens=1000)
+        try:
+            from langchain_core.callbacks import UsageMetadataCallbackHandler
+        except ImportError:  # langchain_core < 0.3.49 has no usage callback; chat tokens are then not recorded
+            UsageMetadataCallbackHandler = None
+        if UsageMetadataCallbackHandler is None:
+            return self.scheduler.call(runnable.invoke, inputs, priority=INTERACTIVE, tokens=tokens)
+        usage_handler = UsageMetadataCallbackHandler()
+        result = self.scheduler.call(
+            runnable.invoke, inputs, config={"callbacks": [usage_handler]}, priority=INTERACTIVE, tokens=tokens
+        )
+        for usage in usage_handler.usage_metadata.values():
+            self.metrics.record_token_usage("chat", usage)
+        return result
+
+    def _query_chain(self, question):
+        """Run the QA chain, reusing cached Cypher, rows and answers where possible."""
+        normalised = normalise_question(question)
+        cypher = self.cypher_cache.get(normalised)
+        self.metrics.record_cache("chat_cypher", cypher is not None)
+
+        if cypher is None:
+            self.metrics.inc("pillbuddy_chat_queries_total", route="chain")
+            result = self._invoke_llm(self.chain, {"query": question})
+            steps = result.get("intermediate_steps") or []
+            if len(steps) >= 2:
+                cypher = steps[0]["query"]
+                self.cypher_cache.set(normalised, cypher)
+                entry = self._cached_rows(cypher, {}, lambda: steps[1]["context"])
+                entry["answers"][normalised] = result["result"]
+            return result
+
+        entry = self._cached_rows(cypher, {}, lambda: self.enhanced_graph.query(cypher)[: self.chain.top_k])
+        answer = entry["answers"].get(normalised)
+        if answer is None:
+            answer = self._invoke_llm(self.chain.qa_chain, {"question": question, "context": entry["rows"]})
+            if isinstance(answer, dict):
+                answer = answer.get("text", answer)
+            entry["answers"][normalised] = answer
+        self.logger.info("Query answered from cached Cypher")
+        self.metrics.inc("pillbuddy_chat_queries_total", route="cached_cypher")
+        return {
+            "query": question,
+            "result": answer,
+            "intermediate_steps": [{"query": cypher}, {"context": entry["rows"]}],
+        }
+
+    def check_interactions(self, medicines):
+        """Check a list of brand or generic names for interactions without going through the LLM."""
+        self.logger.info(f"Checking interactions between {len(medicines)} medicines")
+        return self.interactions.check(medicines)
 
     def query(self, question):
         self.logger.info(f"Processing query: {question}")
+        if self.import_poll_interval is not None and time.monotonic() - self._polled_at >= self.import_poll_interval:
+            self.poll_imports()
         try:
-            result = self.chain.invoke({"query": question})
+            with self.metrics.timer("chat"):
+                result = self._query_template(question)
+                if result is not None:
+                    return result
+
+                result = self._query_chain(question)
             self.logger.info("Query processed successfully")
             return result
         except Exception as e:
@@ -0,0 +1,211 @@
+import re
+from dataclasses import dataclass
+
+# Resolves a medicine by brand or generic name; every template starts from it. Matches the lowercased
+# copies the importer stores, which are indexed, rather than toLower() of the names
+_MATCH_MEDICINE = """
+MATCH (m:Medicine)
+WHERE m.brand_name_lower = $name OR m.generic_name_lower = $name
+"""
+
+KNOWN_NAMES_QUERY = """
+MATCH (m:Medicine)
+UNWIND [m.brand_name, m.generic_name] AS name
+WITH name WHERE name IS NOT NULL
+RETURN DISTINCT toLower(name) AS name
+UNION
+MATCH (di:DrugInteraction)
+RETURN DISTINCT toLower(di.drug_name) AS name
+"""
+
+
+# Questions about a particular patient or condition need more than the stored facts; they go to the chain
+_QUALIFIER_PATTERN = re.compile(
+    r"\b(child|children|kids?|infants?|bab(y|ies)|toddlers?|\d+\s*(years?|yrs?|months?)[\s-]*old|aged?|"
+    r"pregnan\w*|breast-?feed\w*|nursing|lactat\w*|liver|kidney|renal|hepatic|elderly|old age|seniors?|"
+    r"safe\w*|if i (have|am|'m)|allerg\w*)\b"
+)
+
+
+def _join(values):
+    values = [str(value) for value in values if value not in (None, "", [])]
+    return ", ".join(dict.fromkeys(values))
+
+
+@dataclass
+class CypherTemplate:
+    intent: str
+    keywords: tuple
+    cypher: str
+    entities: int = 1
+
+    def format(self, rows, names):
+        return _FORMATTERS[self.intent](rows, names)
+
+
+def _format_uses(rows, names):
+    return f"{rows[0]['medicine']} is used for: {_join(row['use'] for row in rows)}."
+
+
+def _format_side_effects(rows, names):
+    return f"Possible side effects of {rows[0]['medicine']}: {_join(row['side_effect'] for row in rows)}."
+
+
+def _format_interactions(rows, names):
+    lines = [f"{row['drug_name']} ({row['interaction_type']}): {row['effects']}" for row in rows]
+    return f"Known interactions of {rows[0]['medicine']}:\n" + "\n".join(lines)
+
+
+def _format_interaction_pair(rows, names):
+    row = rows[0]
+    return (f"Yes, {row['medicine']} interacts with {row['drug_name']} "
+            f"({row['interaction_type']}): {row['effects']}")
+
+
+def _format_dosage(rows, names):
+    row = rows[0]
+    answer = f"The maximum daily dosage of {row['medicine']} is {row['max_daily_dosage']}."
+    if row["overdose_effects"]:
+        answer += f" Overdose may cause: {_join(row['overdose_effects'])}."
+    return answer
+
+
+def _format_administration(rows, names):
+    row = rows[0]
+    parts = []
+    if row["before_or_after_food"]:
+        parts.append(f"Take it {_join(row['before_or_after_food'])}.")
+    if row["with_what_to_take"]:
+        taken_with = [value for values in row["with_what_to_take"] for value in (values if isinstance(values, list) else [values])]
+        parts.append(f"Take it with: {_join(taken_with)}.")
+    return f"{row['medicine']}: " + " ".join(parts)
+
+
+def _format_ingredients(rows, names):
+    ingredients = _join(f"{row['ingredient']} {row['composition_mg']} mg" if row["composition_mg"] is not None
+                        else row["ingredient"] for row in rows)
+    return f"{rows[0]['medicine']} contains: {ingredients}."
+
+
+def _format_storage(rows, names):
+    row = rows[0]
+    answer = f"Store {row['medicine']}: {_join(row['storage_conditions'])}."
+    if row["shelf_life"]:
+        answer += f" Shelf life: {_join(row['shelf_life'])}."
+    return answer
+
+
+_FORMATTERS = {
+    "interaction_pair": _format_interaction_pair,
+    "interactions": _format_interactions,
+    "side_effects": _format_side_effects,
+    "dosage": _format_dosage,
+    "administration": _format_administration,
+    "ingredients": _format_ingredients,
+    "storage": _format_storage,
+    "uses": _format_uses,
+}
+
+# Checked in order; the first template whose keywords and entity count match wins
+TEMPLATES = [
+    CypherTemplate("interaction_pair", ("interact", " with ", "together", "combine", "mix"), _MATCH_MEDICINE + """
+    MATCH (m)-[r:INTERACTS_WITH]->(di:DrugInteraction)
+    WHERE toLower(di.drug_name) = $other
+       OR EXISTS { MATCH (o:Medicine)-[:CONTAINS]->(i:Ingredient)
+                   WHERE (o.brand_name_lower = $other OR o.generic_name_lower = $other)
+                     AND toLower(i.name) = toLower(di.drug_name) }
+    RETURN coalesce(m.brand_name, m.generic_name) AS medicine, di.drug_name AS drug_name,
+           coalesce(r.interaction_type, di.interaction_type) AS interaction_type,
+           coalesce(r.effects, di.effects) AS effects
+    """, entities=2),
+    CypherTemplate("side_effects", ("side effect", "adverse", "side-effect"), _MATCH_MEDICINE + """
+    MATCH (m)-[:MAY_CAUSE]->(se:SideEffect)
+    RETURN coalesce(m.brand_name, m.generic_name) AS medicine, se.name AS side_effect
+    """),
+    CypherTemplate("interactions", ("interact", "interaction"), _MATCH_MEDICINE + """
+    MATCH (m)-[r:INTERACTS_WITH]->(di:DrugInteraction)
+    RETURN coalesce(m.brand_name, m.generic_name) AS medicine, di.drug_name AS drug_name,
+           coalesce(r.interaction_type, di.interaction_type) AS interaction_type,
+           coalesce(r.effects, di.effects) AS effects
+    """),
+    CypherTemplate("dosage", ("dosage", "dose", "overdose", "how much"), _MATCH_MEDICINE + """
+    MATCH (m)-[:HAS_DOSAGE_GUIDELINE]->(dg:DosageGuideline)
+    RETURN coalesce(m.brand_name, m.generic_name) AS medicine, dg.max_daily_dosage AS max_daily_dosage,
+           [(dg)-[:MAY_CAUSE]->(oe:OverdoseEffect) | oe.name] AS overdose_effects
+    """),
+    CypherTemplate("administration", ("how should i take", "how to take", "how do i take", "food", "empty stomach"), _MATCH_MEDICINE + """
+    WITH m,
+         [(m)-[:TAKEN_BEFORE_OR_AFTER_FOOD]->(baf:BeforeOrAfterFood) | baf.instruction] AS before_or_after_food,
+         [(m)-[:TAKEN_WITH]->(wwt:WithWhatToTake) | wwt.instruction] AS with_what_to_take
+    WHERE size(before_or_after_food) > 0 OR size(with_what_to_take) > 0
+    RETURN coalesce(m.brand_name, m.generic_name) AS medicine, before_or_after_food, with_what_to_take
+    """),
+    CypherTemplate("ingredients", ("ingredient", "composition", "contain", "made of", "what is in"), _MATCH_MEDICINE + """
+    MATCH (m)-[c:CONTAINS]->(i:Ingredient)
+    RETURN coalesce(m.brand_name, m.generic_name) AS medicine, i.name AS ingredient,
+           coalesce(c.composition_mg, i.composition_mg) AS composition_mg
+    """),
+    CypherTemplate("storage", ("store", "storage", "shelf life", "expire", "expiry"), _MATCH_MEDICINE + """
+    WITH m,
+         [(m)-[:STORED_UNDER]->(sc:StorageCondition) | sc.condition] AS storage_conditions,
+         [(m)-[:HAS_SHELF_LIFE]->(sl:ShelfLife) | sl.duration] AS shelf_life
+    WHERE size(storage_conditions) > 0 OR size(shelf_life) > 0
+    RETURN coalesce(m.brand_name, m.generic_name) AS medicine, storage_conditions, shelf_life
+    """),
+    # Only phrases that ask what the medicine is for: a bare "what is" also starts price, safety and comparison questions
+    CypherTemplate("uses", ("used for", "used to treat", "use of", "uses of", "what are the uses", "treat ", "treats",
+                            "in what cases", "indicat", "what is it for", " for?"), _MATCH_MEDICINE + """
+    MATCH (m)-[:USED_FOR]->(u:Use)
+    RETURN coalesce(m.brand_name, m.generic_name) AS medicine, u.name AS use
+    """),
+]
+
+
+class CypherTemplateRouter:
+    """Maps frequent question shapes onto parameterised Cypher, keyed on known medicine names."""
+
+    def __init__(self, names=(), templates=TEMPLATES):
+        self.templates = templates
+        self.refresh_names(names)
+
+    def refresh_names(self, names):
+        self.names = {name.lower() for name in names if name}
+        names = sorted(self.names, key=len, reverse=True)
+        self._names_pattern = (
+            re.compile(r"(?<!\w)(" + "|".join(re.escape(name) for name in names) + r")(?!\w)")
+            if names else None
+        )
+
+    def add_names(self, names):
+        new_names = {name.lower() for name in names if name} - self.names
+        if new_names:
+            self.refresh_names(self.names | new_names)
+
+    def find_entities(self, question):
+        """Known names mentioned in the question, in order of appearance, longest match first."""
+        if self._names_pattern is None:
+            return []
+        return list(dict.fromkeys(self._names_pattern.findall(question.lower())))
+
+    def route(self, question):
+        """Return (template, params) for a recognised question, or None to fall back to the LLM chain.
+
+        Questions qualified by a patient group or condition (a child, pregnancy, liver disease, "is it
+        safe") always fall back, since the templates only return the medicine's general facts.
+        """
+        entities = self.find_entities(question)
+        if not entities:
+            return None
+        text = question.lower()
+        # Names are blanked first so that a brand such as "Liver-52" is not mistaken for a qualifier
+        if _QUALIFIER_PATTERN.search(self._names_pattern.sub(" ", text)):
+            return None
+        for template in self.templates:
+            if len(entities) < template.entities:
+                continue
+            if any(keyword in text for keyword in template.keywords):
+                params = {"name": entities[0]}
+                if template.entities == 2:
+                    params["other"] = entities[1]
+                return template, params
+        return None
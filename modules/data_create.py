@@ -1,29 +1,486 @@
+import hashlib
+import json
 import logging
-from neo4j import GraphDatabase
-import os
-from dotenv import load_dotenv
+import re
+import threading
+from contextlib import contextmanager
+from .metrics import REGISTRY
+from .normalise import EntityNormaliser
+from .snapshot import write_snapshot
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+# Each relationship family is written with a single UNWIND statement. Rows carry the
+# medicine's brand_name plus either the node properties or an ``items`` list, so the
+# Medicine node is matched once per medicine rather than once per related node.
+# Order matters: parents (Medicine, DosageGuideline, MechanismOfAction) come first.
+MEDICINE_QUERIES = [
+    ("medicine", """
+    UNWIND $rows AS row
+    MERGE (m:Medicine {brand_name: row.brand_name})
+    SET m.generic_name = row.generic_name, m.manufacturer = row.manufacturer, m.power_mg = row.power_mg,
+        m.brand_name_lower = toLower(row.brand_name), m.generic_name_lower = toLower(row.generic_name)
+    """),
+    ("ingredients", """
+    UNWIND $rows AS row
+    MATCH (m:Medicine {brand_name: row.brand_name})
+    UNWIND row.items AS item
+    MERGE (i:Ingredient {name: item.name})
+    MERGE (m)-[c:CONTAINS]->(i)
+    SET c.composition_mg = item.composition_mg
+    """),
+    ("uses", """
+    UNWIND $rows AS row
+    MATCH (m:Medicine {brand_name: row.brand_name})
+    UNWIND row.items AS use
+    MERGE (u:Use {name: use})
+    MERGE (m)-[:USED_FOR]->(u)
+    """),
+    ("dosage_guidelines", """
+    UNWIND $rows AS row
+    MATCH (m:Medicine {brand_name: row.brand_name})
+    MERGE (dg:DosageGuideline {brand_name: row.brand_name})
+    SET dg.max_daily_dosage = row.max_daily_dosage
+    MERGE (m)-[:HAS_DOSAGE_GUIDELINE]->(dg)
+    """),
+    ("overdose_effects", """
+    UNWIND $rows AS row
+    MATCH (dg:DosageGuideline {brand_name: row.brand_name})
+    UNWIND row.items AS effect
+    MERGE (oe:OverdoseEffect {name: effect})
+    MERGE (dg)-[:MAY_CAUSE]->(oe)
+    """),
+    ("administration_instructions", """
+    UNWIND $rows AS row
+    MATCH (m:Medicine {brand_name: row.brand_name})
+    UNWIND row.items AS item
+    MERGE (ai:AdministrationInstruction {instruction_type: item.key, instruction: item.instruction})
+    MERGE (m)-[:ADMINISTERED_WITH]->(ai)
+    """),
+    ("with_what_to_take", """
+    UNWIND $rows AS row
+    MATCH (m:Medicine {brand_name: row.brand_name})
+    MERGE (wwt:WithWhatToTake {instruction: row.instruction})
+    MERGE (m)-[:TAKEN_WITH]->(wwt)
+    """),
+    ("before_or_after_food", """
+    UNWIND $rows AS row
+    MATCH (m:Medicine {brand_name: row.brand_name})
+    MERGE (baf:BeforeOrAfterFood {instruction: row.instruction})
+    MERGE (m)-[:TAKEN_BEFORE_OR_AFTER_FOOD]->(baf)
+    """),
+    ("mechanism_of_action", """
+    UNWIND $rows AS row
+    MATCH (m:Medicine {brand_name: row.brand_name})
+    MERGE (moa:MechanismOfAction {brand_name: row.brand_name})
+    SET moa.description = row.description
+    MERGE (m)-[:WORKS_BY]->(moa)
+    """),
+    ("detailed_steps", """
+    UNWIND $rows AS row
+    MATCH (moa:MechanismOfAction {brand_name: row.brand_name})
+    UNWIND row.items AS step
+    MERGE (ms:MechanismStep {description: step})
+    MERGE (moa)-[:INVOLVES]->(ms)
+    """),
+    ("side_effects", """
+    UNWIND $rows AS row
+    MATCH (m:Medicine {brand_name: row.brand_name})
+    UNWIND row.items AS effect
+    MERGE (se:SideEffect {name: effect})
+    MERGE (m)-[:MAY_CAUSE]->(se)
+    """),
+    ("drug_interactions", """
+    UNWIND $rows AS row
+    MATCH (m:Medicine {brand_name: row.brand_name})
+    UNWIND row.items AS item
+    MERGE (di:DrugInteraction {drug_name: item.drug_name})
+    MERGE (m)-[r:INTERACTS_WITH]->(di)
+    SET r.interaction_type = item.interaction_type, r.effects = item.effects
+    """),
+    ("storage_conditions", """
+    UNWIND $rows AS row
+    MATCH (m:Medicine {brand_name: row.brand_name})
+    UNWIND row.items AS condition
+    MERGE (sc:StorageCondition {condition: condition})
+    MERGE (m)-[:STORED_UNDER]->(sc)
+    """),
+    ("shelf_life", """
+    UNWIND $rows AS row
+    MATCH (m:Medicine {brand_name: row.brand_name})
+    MERGE (sl:ShelfLife {duration: row.shelf_life})
+    MERGE (m)-[:HAS_SHELF_LIFE]->(sl)
+    """),
+]
+
+# Lowercased copies of the Medicine names, so case-insensitive lookups are index seeks instead of toLower()
+# scans, and the import time readers in other processes poll for changes (Neo4jQueryHandler.poll_imports)
+LOOKUP_INDEXES = [("Medicine", "brand_name_lower"), ("Medicine", "generic_name_lower"), ("Medicine", "imported_at")]
+
+# Fills the lowercased names in on medicines imported before they were written
+LOOKUP_KEYS_BACKFILL_QUERY = """
+MATCH (m:Medicine)
+WHERE m.brand_name_lower IS NULL
+SET m.brand_name_lower = toLower(m.brand_name), m.generic_name_lower = toLower(m.generic_name)
+"""
+
+STORED_HASHES_QUERY = """
+UNWIND $brand_names AS brand_name
+MATCH (m:Medicine {brand_name: brand_name})
+RETURN brand_name, m.content_hash AS content_hash, m.family_hashes AS family_hashes
+"""
+
+STORE_HASHES_QUERY = """
+UNWIND $rows AS row
+MATCH (m:Medicine {brand_name: row.brand_name})
+SET m.content_hash = row.content_hash, m.family_hashes = row.family_hashes, m.imported_at = timestamp()
+"""
+
+# Relationship type and target label written from the Medicine node by each family, for stale-edge removal.
+# overdose_effects and detailed_steps hang off the medicine's own DosageGuideline/MechanismOfAction node
+# (keyed by brand_name), so CHILD_RELATIONSHIPS also names that parent label; they are rewritten whenever
+# their parent family is.
+FAMILY_RELATIONSHIPS = {
+    "ingredients": ("CONTAINS", "Ingredient"),
+    "uses": ("USED_FOR", "Use"),
+    "dosage_guidelines": ("HAS_DOSAGE_GUIDELINE", "DosageGuideline"),
+    "administration_instructions": ("ADMINISTERED_WITH", "AdministrationInstruction"),
+    "with_what_to_take": ("TAKEN_WITH", "WithWhatToTake"),
+    "before_or_after_food": ("TAKEN_BEFORE_OR_AFTER_FOOD", "BeforeOrAfterFood"),
+    "mechanism_of_action": ("WORKS_BY", "MechanismOfAction"),
+    "side_effects": ("MAY_CAUSE", "SideEffect"),
+    "drug_interactions": ("INTERACTS_WITH", "DrugInteraction"),
+    "storage_conditions": ("STORED_UNDER", "StorageCondition"),
+    "shelf_life": ("HAS_SHELF_LIFE", "ShelfLife"),
+}
+FAMILY_PARENTS = {"overdose_effects": "dosage_guidelines", "detailed_steps": "mechanism_of_action"}
+CHILD_RELATIONSHIPS = {
+    "overdose_effects": ("DosageGuideline", "MAY_CAUSE", "OverdoseEffect"),
+    "detailed_steps": ("MechanismOfAction", "INVOLVES", "MechanismStep"),
+}
+
+# Constraints from when DosageGuideline/MechanismOfAction nodes were shared by value; they would
+# reject two medicines with the same maximum dosage or mechanism description
+RETIRED_CONSTRAINTS = ["dosageguideline_max_daily_dosage_unique", "mechanismofaction_description_unique"]
+
+
+def _normalise(value):
+    """Canonical form of a payload: strings stripped, empty values dropped, lists sorted."""
+    if isinstance(value, dict):
+        return {key: _normalise(item) for key, item in sorted(value.items()) if item not in (None, "", [], {})}
+    if isinstance(value, list):
+        items = [_normalise(item) for item in value if item not in (None, "", [], {})]
+        return sorted(items, key=lambda item: json.dumps(item, sort_keys=True, default=str))
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def content_hash(value):
+    """SHA-256 of the normalised JSON form of a payload."""
+    return hashlib.sha256(json.dumps(_normalise(value), sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+# Reads stored medicines back into MedicineDetailedInfo shape; prefixed by a MATCH binding m
+_MEDICINE_DETAILS_RETURN = """
+OPTIONAL MATCH (m)-[:HAS_DOSAGE_GUIDELINE]->(dg:DosageGuideline)
+OPTIONAL MATCH (m)-[:WORKS_BY]->(moa:MechanismOfAction)
+WITH m, head(collect(DISTINCT dg)) AS dg, head(collect(DISTINCT moa)) AS moa
+RETURN m {.generic_name, .brand_name, .manufacturer, .power_mg} AS medicine,
+       [(m)-[c:CONTAINS]->(i:Ingredient) | {name: i.name, composition_mg: coalesce(c.composition_mg, i.composition_mg)}] AS ingredients,
+       [(m)-[:USED_FOR]->(u:Use) | u.name] AS uses,
+       dg.max_daily_dosage AS max_daily_dosage,
+       CASE WHEN dg IS NULL THEN [] ELSE [(dg)-[:MAY_CAUSE]->(oe:OverdoseEffect) | oe.name] END AS overdose_effects,
+       [(m)-[:TAKEN_WITH]->(wwt:WithWhatToTake) | wwt.instruction] AS with_what_to_take,
+       [(m)-[:TAKEN_BEFORE_OR_AFTER_FOOD]->(baf:BeforeOrAfterFood) | baf.instruction] AS before_or_after_food,
+       moa.description AS mechanism_description,
+       CASE WHEN moa IS NULL THEN [] ELSE [(moa)-[:INVOLVES]->(ms:MechanismStep) | ms.description] END AS detailed_steps,
+       [(m)-[:MAY_CAUSE]->(se:SideEffect) | se.name] AS side_effects,
+       [(m)-[r:INTERACTS_WITH]->(di:DrugInteraction) | {drug_name: di.drug_name,
+        interaction_type: coalesce(r.interaction_type, di.interaction_type), effects: coalesce(r.effects, di.effects)}] AS drug_interactions,
+       [(m)-[:STORED_UNDER]->(sc:StorageCondition) | sc.condition] AS storage_conditions,
+       [(m)-[:HAS_SHELF_LIFE]->(sl:ShelfLife) | sl.duration] AS shelf_life
+"""
+
+# Medicines matching a generic name
+MEDICINE_DETAILS_QUERY = """
+MATCH (m:Medicine)
+WHERE m.generic_name_lower = toLower($generic_name)""" + _MEDICINE_DETAILS_RETURN
+
+# Every medicine, for snapshot export
+ALL_MEDICINE_DETAILS_QUERY = """
+MATCH (m:Medicine)""" + _MEDICINE_DETAILS_RETURN
+
+
+def schema_requirements():
+    """Derive the constraints and indexes the import queries need from their MERGE and MATCH keys.
+
+    Nodes merged on a single property get a uniqueness constraint, nodes merged on several
+    properties get a composite index, and properties only used for MATCH lookups (plus LOOKUP_INDEXES)
+    get an index.
+    """
+    requirements = {}
+    for _, query in MEDICINE_QUERIES:
+        for label, body in re.findall(r"MERGE \(\w+:(\w+) \{(.*?)\}\)", query, re.S):
+            properties = tuple(re.findall(r"(\w+):", body))
+            kind = "constraint" if len(properties) == 1 else "index"
+            requirements[(label, properties)] = kind
+        for label, prop in re.findall(r"MATCH \(\w*:(\w+) \{(\w+):", query):
+            requirements.setdefault((label, (prop,)), "index")
+    for label, prop in LOOKUP_INDEXES:
+        requirements.setdefault((label, (prop,)), "index")
+
+    return [
+        {
+            "name": f"{label.lower()}_{'_'.join(properties)}_{'unique' if kind == 'constraint' else 'index'}",
+            "kind": kind,
+            "label": label,
+            "properties": list(properties),
+        }
+        for (label, properties), kind in requirements.items()
+    ]
+
 
 class MedicineDataImporter:
-    def __init__(self, uri, username, password):
-        self.driver = GraphDatabase.driver(uri, auth=(username, password))
+    def __init__(self, uri=None, username=None, password=None, batch_size=500, metrics=None, driver=None,
+                 normaliser=None, snapshot_path=None):
+        """``driver`` is an optional Neo4j driver shared with other components; the importer then
+        leaves closing it to the caller. Otherwise a driver for ``uri`` is opened on first use.
+
+        Ingredient, use, side effect, overdose effect, mechanism step, interacting drug and storage
+        condition names go through ``normaliser`` before they are merged; by default an
+        EntityNormaliser indexing the names already in this graph. Pass False to write them as given.
+
+        With ``snapshot_path`` the graph is re-exported there (see export_snapshot) after every
+        import that changed something, for SnapshotStore readers to hot-reload. Inside
+        deferred_snapshot() that export happens once, when the block ends.
+        """
+        self.uri = uri
+        self.auth = (username, password)
+        self._driver = driver
+        self._owns_driver = driver is None
+        self._driver_lock = threading.Lock()
+        self.batch_size = batch_size
+        self.metrics = metrics or REGISTRY
+        if normaliser is None:
+            normaliser = EntityNormaliser(loader=self.query, metrics=self.metrics)
+        self.normaliser = normaliser or None
+        self.snapshot_path = snapshot_path
+        self._export_lock = threading.Lock()
+        self._deferred_lock = threading.Lock()
+        self._deferred_depth = 0
+        self._deferred_names = set()
+        self.import_listeners = []
         logger.info("MedicineDataImporter initialized")
 
+    @property
+    def driver(self):
+        if self._driver is None:
+            with self._driver_lock:
+                if self._driver is None:
+                    from neo4j import GraphDatabase
+                    self._driver = GraphDatabase.driver(self.uri, auth=self.auth)
+        return self._driver
+
     def close(self):
-        self.driver.close()
-        logger.info("Neo4j connection closed")
+        if self._owns_driver and self._driver is not None:
+            self._driver.close()
+            self._driver = None
+            logger.info("Neo4j connection closed")
 
-    def import_medicine_data(self, medicine_data):
-        logger.info("Starting medicine data import")
+    def ensure_schema(self, wait=True, timeout=300):
+        """Idempotently create the constraints and indexes in schema_requirements() and return their state."""
+        with self.driver.session() as session:
+            session.run(LOOKUP_KEYS_BACKFILL_QUERY).consume()
+            for name in RETIRED_CONSTRAINTS:
+                session.run(f"DROP CONSTRAINT {name} IF EXISTS").consume()
+            for requirement in schema_requirements():
+                label, properties = requirement["label"], requirement["properties"]
+                if requirement["kind"] == "constraint":
+                    query = (f"CREATE CONSTRAINT {requirement['name']} IF NOT EXISTS "
+                             f"FOR (n:{label}) REQUIRE n.{properties[0]} IS UNIQUE")
+                else:
+                    keys = ", ".join(f"n.{prop}" for prop in properties)
+                    query = f"CREATE INDEX {requirement['name']} IF NOT EXISTS FOR (n:{label}) ON ({keys})"
+                try:
+                    session.run(query).consume()
+                except Exception as e:
+                    logger.error(f"Failed to create {requirement['kind']} {requirement['name']}: {e}")
+            if wait:
+                session.run("CALL db.awaitIndexes($timeout)", timeout=timeout).consume()
+        return self.schema_status()
+
+    def schema_status(self):
+        """Report whether each required constraint or index exists and its index state."""
         with self.driver.session() as session:
-            session.execute_write(self._create_medicine_nodes, medicine_data)
+            indexes = {
+                (record["labelsOrTypes"][0], tuple(record["properties"])): record
+                for record in session.run(
+                    "SHOW INDEXES YIELD name, state, labelsOrTypes, properties, owningConstraint "
+                    "WHERE labelsOrTypes IS NOT NULL AND properties IS NOT NULL"
+                )
+            }
+            constraints = {
+                (record["labelsOrTypes"][0], tuple(record["properties"]))
+                for record in session.run(
+                    "SHOW CONSTRAINTS YIELD type, labelsOrTypes, properties "
+                    "WHERE type IN ['UNIQUENESS', 'NODE_PROPERTY_UNIQUENESS']"
+                )
+            }
+
+        status = []
+        for requirement in schema_requirements():
+            key = (requirement["label"], tuple(requirement["properties"]))
+            index = indexes.get(key)
+            present = key in constraints if requirement["kind"] == "constraint" else index is not None
+            status.append({**requirement, "present": present, "state": index["state"] if index else None})
+            if not present:
+                logger.warning(f"Missing {requirement['kind']} on :{requirement['label']}{requirement['properties']}")
+            elif index is not None and index["state"] != "ONLINE":
+                logger.warning(f"Index {index['name']} is {index['state']}")
+        return status
+
+    def add_import_listener(self, callback):
+        """Register ``callback(names)``, called after each committed import with the medicines' lowercased names."""
+        self.import_listeners.append(callback)
+
+    def _notify_import(self, names):
+        if not names:
+            return
+        for callback in self.import_listeners:
+            try:
+                callback(names)
+            except Exception as e:
+                logger.error(f"Import listener failed: {e}", exc_info=True)
+
+    @staticmethod
+    def _check_brand_names(tool_calls):
+        """Every node is keyed on the medicine's brand name, so a payload without one cannot be imported."""
+        missing = [item['args'].get('generic_name') or "unnamed medicine" for item in tool_calls
+                   if item['name'] == 'MedicineDetailedInfo' and not item['args'].get('brand_name')]
+        if missing:
+            raise ValueError(f"Cannot import medicine without a brand name: {', '.join(missing)}")
+
+    def import_medicine_data(self, medicine_data, force=False):
+        """Import one tool-call payload. Unchanged medicines are skipped unless ``force`` is set.
+
+        Raises ValueError, writing nothing, if a medicine has no brand name.
+        """
+        self._check_brand_names(medicine_data)
+        logger.info("Starting medicine data import")
+        if self.normaliser is not None:
+            self.normaliser.ensure_loaded()
+        with self.metrics.timer("import"), self.driver.session() as session:
+            changed = session.execute_write(self._create_medicine_nodes, medicine_data, force)
+        self._publish(changed)
         logger.info("Medicine data import completed")
+
+    def import_medicines_data(self, medicines_data, force=False):
+        """Import several tool-call payloads, writing up to ``batch_size`` medicines per transaction.
+
+        Raises ValueError, writing nothing, if any medicine has no brand name.
+        """
+        tool_calls = [item for medicine_data in medicines_data for item in medicine_data]
+        self._check_brand_names(tool_calls)
+        logger.info(f"Starting batched import of {len(tool_calls)} tool calls")
+        if self.normaliser is not None:
+            self.normaliser.ensure_loaded()
+        changed = set()
+        with self.metrics.timer("import", batched=True), self.driver.session() as session:
+            for start in range(0, len(tool_calls), self.batch_size):
+                batch = tool_calls[start:start + self.batch_size]
+                batch_changed = session.execute_write(self._create_medicine_nodes, batch, force)
+                changed |= batch_changed
+                if not self.snapshot_path:
+                    self._notify_import(batch_changed)
+        # With a snapshot, listeners wait for the export so they can reload it
+        if self.snapshot_path:
+            self._publish(changed)
+        logger.info("Batched medicine data import completed")
+
+    def _publish(self, changed):
+        """Export the snapshot (if any) and notify listeners of ``changed``, or hold them for deferred_snapshot.
+
+        The import has already committed, so a failed export is logged rather than raised; listeners
+        are still notified so caches are invalidated, and the next successful export catches up.
+        """
+        if not changed:
+            return
+        if self.snapshot_path:
+            with self._deferred_lock:
+                if self._deferred_depth:
+                    self._deferred_names |= changed
+                    return
+            try:
+                self.export_snapshot(self.snapshot_path)
+            except Exception as e:
+                logger.error(f"Snapshot export to {self.snapshot_path} failed: {e}", exc_info=True)
+                self.metrics.inc("pillbuddy_snapshot_export_errors_total")
+        self._notify_import(changed)
+
+    @contextmanager
+    def deferred_snapshot(self):
+        """Export the snapshot and notify listeners once when the block ends instead of after every import.
+
+        A full export reads the whole catalogue, so a batch of single-medicine imports (e.g. concurrent
+        Pipeline.arun calls) would otherwise cost one export per image.
+        """
+        with self._deferred_lock:
+            self._deferred_depth += 1
+        try:
+            yield
+        finally:
+            with self._deferred_lock:
+                self._deferred_depth -= 1
+                changed = set()
+                if not self._deferred_depth:
+                    changed, self._deferred_names = self._deferred_names, set()
+            self._publish(changed)
         
+    def query(self, cypher, params=None):
+        """Run a read query and return its records as dicts, matching Neo4jGraph.query."""
+        with self.driver.session() as session:
+            return session.execute_read(lambda tx: [record.data() for record in tx.run(cypher, params or {})])
+
+    def export_snapshot(self, path):
+        """Write every medicine to a read-only snapshot file for modules.snapshot.SnapshotStore."""
+        # Serialised so that an export reading the graph earlier can never replace a newer one
+        with self._export_lock, self.metrics.timer("snapshot_export"):
+            write_snapshot(path, self.query(ALL_MEDICINE_DETAILS_QUERY))
+
+    def find_medicine_data(self, generic_name):
+        """Return the stored MedicineDetailedInfo args of every medicine with this generic name."""
+        with self.driver.session() as session:
+            records = session.execute_read(
+                lambda tx: list(tx.run(MEDICINE_DETAILS_QUERY, generic_name=generic_name))
+            )
+        return [self._record_to_args(record) for record in records]
+
+    @staticmethod
+    def _record_to_args(record):
+        args = dict(record["medicine"])
+        args["ingredients"] = record["ingredients"]
+        args["uses"] = record["uses"]
+        args["dosage_guidelines"] = {
+            "max_daily_dosage": record["max_daily_dosage"],
+            "overdose_effects": record["overdose_effects"] or None,
+        }
+        args["administration_instructions"] = {
+            "with_what_to_take": record["with_what_to_take"][0] if record["with_what_to_take"] else None,
+            "before_or_after_food": record["before_or_after_food"][0] if record["before_or_after_food"] else None,
+        }
+        args["mechanism_of_action"] = {
+            "description": record["mechanism_description"],
+            "detailed_steps": record["detailed_steps"],
+        }
+        args["side_effects"] = record["side_effects"]
+        args["drug_interactions"] = record["drug_interactions"]
+        args["storage_and_shelf_life"] = {
+            "storage_conditions": record["storage_conditions"] or None,
+            "shelf_life": record["shelf_life"][0] if record["shelf_life"] else None,
+        }
+        return args
+
     def get_none_fields(self, data, parent_key=""):
         none_fields = []
 
@@ -44,158 +501,177 @@ class MedicineDataImporter:
     
     def filter_none_values(self, data):
         return {k: v for k, v in data.items() if v not in (None, "", [], {})}
-    
-    def _create_medicine_nodes(self, tx, medicine_data):
-        for item in medicine_data:
-            if item['name'] == 'MedicineDetailedInfo':
-                args = item['args']
-                none_fields = self.get_none_fields(item['args'])
-                logger.info(f"None fields: {none_fields}")
-                logger.info(f"Processing medicine: {args['brand_name']}")
-                
-                # Create Medicine node
-                query = """
-                MERGE (m:Medicine {
-                    generic_name: $generic_name,
-                    brand_name: $brand_name,
-                    manufacturer: $manufacturer,
-                    power_mg: $power_mg
-                })
+
+    def _collect_rows(self, args, rows):
+        """Append the UNWIND rows for one MedicineDetailedInfo payload to ``rows``, keyed by family."""
+        none_fields = self.get_none_fields(args)
+        logger.info(f"None fields: {none_fields}")
+        logger.info(f"Processing medicine: {args['brand_name']}")
+        brand_name = args['brand_name']
+
+        # MERGE rejects null keys, so items and rows without one are dropped rather than failing the batch
+        def add_items(family, items, key=None):
+            items = [item for item in items if (item if key is None else item[key]) is not None]
+            if items:
+                rows[family].append({"brand_name": brand_name, "items": items})
+
+        def add_row(family, **row):
+            if all(value is not None for value in row.values()):
+                rows[family].append({"brand_name": brand_name, **row})
+
+        rows["medicine"].append({
+            "generic_name": args.get('generic_name'),
+            "brand_name": brand_name,
+            "manufacturer": args.get('manufacturer'),
+            "power_mg": args.get('power_mg'),
+        })
+
+        if 'ingredients' in args and 'ingredients' not in none_fields:
+            add_items("ingredients", [
+                {"name": ingredient.get('name'), "composition_mg": ingredient.get('composition_mg')}
+                for ingredient in args['ingredients']
+            ], key="name")
+
+        if 'uses' in args and 'uses' not in none_fields:
+            add_items("uses", list(args['uses']))
+
+        dosage_guidelines = args.get('dosage_guidelines') or {}
+        if 'dosage_guidelines' in args and 'dosage_guidelines' not in none_fields:
+            add_row("dosage_guidelines", max_daily_dosage=dosage_guidelines.get('max_daily_dosage'))
+
+        if 'overdose_effects' in dosage_guidelines and 'dosage_guidelines.overdose_effects' not in none_fields:
+            add_items("overdose_effects", list(dosage_guidelines['overdose_effects']))
+
+        administration_instructions = args.get('administration_instructions') or {}
+        if 'administration_instructions' in args and 'administration_instructions' not in none_fields:
+            add_items("administration_instructions", [
+                {"key": key, "instruction": instruction}
+                for key, instruction in self.filter_none_values(administration_instructions).items()
+            ], key="instruction")
+
+        if 'with_what_to_take' in administration_instructions and 'administration_instructions.with_what_to_take' not in none_fields:
+            add_row("with_what_to_take", instruction=administration_instructions['with_what_to_take'])
+
+        if 'before_or_after_food' in administration_instructions and 'administration_instructions.before_or_after_food' not in none_fields:
+            add_row("before_or_after_food", instruction=administration_instructions['before_or_after_food'])
+
+        mechanism_of_action = args.get('mechanism_of_action') or {}
+        if 'mechanism_of_action' in args and 'mechanism_of_action' not in none_fields:
+            add_row("mechanism_of_action", description=mechanism_of_action.get('description'))
+
+        if 'detailed_steps' in mechanism_of_action and 'mechanism_of_action.detailed_steps' not in none_fields:
+            add_items("detailed_steps", list(mechanism_of_action['detailed_steps']))
+
+        if 'side_effects' in args and 'side_effects' not in none_fields:
+            add_items("side_effects", list(args['side_effects']))
+
+        if 'drug_interactions' in args and 'drug_interactions' not in none_fields:
+            add_items("drug_interactions", [
+                {
+                    "drug_name": interaction.get('drug_name'),
+                    "interaction_type": interaction.get('interaction_type'),
+                    "effects": interaction.get('effects'),
+                }
+                for interaction in args['drug_interactions']
+            ], key="drug_name")
+
+        storage_and_shelf_life = args.get('storage_and_shelf_life') or {}
+        if 'storage_conditions' in storage_and_shelf_life and 'storage_and_shelf_life.storage_conditions' not in none_fields:
+            add_items("storage_conditions", list(storage_and_shelf_life['storage_conditions']))
+
+        if 'shelf_life' in storage_and_shelf_life and 'storage_and_shelf_life.shelf_life' not in none_fields:
+            add_row("shelf_life", shelf_life=storage_and_shelf_life['shelf_life'])
+
+    def _run(self, tx, query, family, **params):
+        tx.run(query, **params)
+        self.metrics.inc("pillbuddy_neo4j_statements_total", family=family)
+
+    def _create_medicine_nodes(self, tx, medicine_data, force=False):
+        """Write the changed parts of each MedicineDetailedInfo payload; returns the changed medicines' names.
+
+        The content hash of the normalised payload is compared with the one stored on the Medicine
+        node, and matching medicines are skipped. For the rest, only relationship families whose own
+        hash changed are rewritten, after deleting that family's existing edges from the medicine.
+        With ``force`` no medicine is skipped and every family is rewritten that way.
+        """
+        payloads = [item['args'] for item in medicine_data if item['name'] == 'MedicineDetailedInfo']
+        if not payloads:
+            return set()
+
+        # Read even with ``force``: it decides which medicines already have edges that must be replaced
+        stored = {}
+        brand_names = [args['brand_name'] for args in payloads]
+        for record in tx.run(STORED_HASHES_QUERY, brand_names=brand_names):
+            stored[record["brand_name"]] = record
+        self.metrics.inc("pillbuddy_neo4j_statements_total", family="stored_hashes")
+
+        rows = {family: [] for family, _ in MEDICINE_QUERIES}
+        stale = {family: [] for family in (*FAMILY_RELATIONSHIPS, *CHILD_RELATIONSHIPS)}
+        hash_rows = []
+        changed = set()
+        for args in payloads:
+            brand_name = args['brand_name']
+            medicine_hash = content_hash(args)
+            previous = stored.get(brand_name)
+            if not force and previous is not None and previous["content_hash"] == medicine_hash:
+                logger.info(f"Skipping unchanged medicine: {brand_name}")
+                self.metrics.inc("pillbuddy_medicines_skipped_total")
+                continue
+
+            medicine_rows = {family: [] for family, _ in MEDICINE_QUERIES}
+            self._collect_rows(args, medicine_rows)
+            if self.normaliser is not None:
+                self.normaliser.normalise_rows(medicine_rows)
+            family_hashes = {family: content_hash(family_rows) for family, family_rows in medicine_rows.items()}
+            # ``force`` rewrites every family of the medicine, replacing its existing edges
+            previous_hashes = dict(
+                entry.split("=", 1) for entry in (previous["family_hashes"] or [])
+            ) if previous is not None and not force else {}
+
+            changed_families = {
+                family for family, family_hash in family_hashes.items()
+                if previous_hashes.get(family) != family_hash
+            }
+            # Children are written through their parent node, so either changing rewrites both; this also
+            # moves medicines imported before parents were keyed per medicine onto their own node
+            changed_families |= {parent for child, parent in FAMILY_PARENTS.items() if child in changed_families}
+            changed_families |= {child for child, parent in FAMILY_PARENTS.items() if parent in changed_families}
+
+            for family in changed_families:
+                if previous is not None and family in stale:
+                    stale[family].append(brand_name)
+                rows[family].extend(medicine_rows[family])
+
+            hash_rows.append({
+                "brand_name": brand_name,
+                "content_hash": medicine_hash,
+                "family_hashes": [f"{family}={family_hash}" for family, family_hash in sorted(family_hashes.items())],
+            })
+            changed.update(str(args[key]).lower() for key in ('brand_name', 'generic_name') if args.get(key))
+
+        if not hash_rows:
+            return set()
+        self.metrics.inc("pillbuddy_medicines_imported_total", len(hash_rows))
+
+        for family, brand_names in stale.items():
+            if brand_names:
+                if family in CHILD_RELATIONSHIPS:
+                    parent, relationship, label = CHILD_RELATIONSHIPS[family]
+                else:
+                    parent, (relationship, label) = "Medicine", FAMILY_RELATIONSHIPS[family]
+                query = f"""
+                UNWIND $brand_names AS brand_name
+                MATCH (:{parent} {{brand_name: brand_name}})-[r:{relationship}]->(:{label})
+                DELETE r
                 """
-                tx.run(query, **args)
-                logger.debug(f"Created or merged Medicine node for {args['brand_name']}")
-
-                # Create Ingredient nodes and relationships
-                if 'ingredients' in args and 'ingredients' not in none_fields:
-                    for ingredient in args['ingredients']:
-                        query = """
-                        MATCH (m:Medicine {brand_name: $brand_name})
-                        MERGE (i:Ingredient {name: $name})
-                        ON CREATE SET i.composition_mg = $composition_mg
-                        MERGE (m)-[:CONTAINS]->(i)
-                        """
-                        tx.run(query, brand_name=args['brand_name'], **ingredient)
-                
-                # Create Use nodes and relationships
-                if 'uses' in args and 'uses' not in none_fields:
-                    for use in args['uses']:
-                        query = """
-                        MATCH (m:Medicine {brand_name: $brand_name})
-                        MERGE (u:Use {name: $use})
-                        MERGE (m)-[:USED_FOR]->(u)
-                        """
-                        tx.run(query, brand_name=args['brand_name'], use=use)
-                
-                # Create DosageGuideline node and relationship
-                if 'dosage_guidelines' in args and 'dosage_guidelines' not in none_fields:
-                    query = """
-                    MATCH (m:Medicine {brand_name: $brand_name})
-                    MERGE (dg:DosageGuideline {max_daily_dosage: $max_daily_dosage})
-                    MERGE (m)-[:HAS_DOSAGE_GUIDELINE]->(dg)
-                    """
-                    tx.run(query, brand_name=args['brand_name'], **args['dosage_guidelines'])
-
-                # Create OverdoseEffect nodes and relationships
-                if 'overdose_effects' in args['dosage_guidelines'] and 'dosage_guidelines.overdose_effects' not in none_fields:
-                    for effect in args['dosage_guidelines']['overdose_effects']:
-                        query = """
-                        MATCH (dg:DosageGuideline)-[:HAS_DOSAGE_GUIDELINE]-(m:Medicine {brand_name: $brand_name})
-                        MERGE (oe:OverdoseEffect {name: $effect})
-                        MERGE (dg)-[:MAY_CAUSE]->(oe)
-                        """
-                        tx.run(query, brand_name=args['brand_name'], effect=effect)
-                
-                # Create AdministrationInstruction nodes and relationships
-                if 'administration_instructions' in args and 'administration_instructions' not in none_fields:
-                    for key, instruction in args['administration_instructions'].items():
-                        query = """
-                        MATCH (m:Medicine {brand_name: $brand_name})
-                        MERGE (ai:AdministrationInstruction {instruction_type: $key, instruction: $instruction})
-                        MERGE (m)-[:ADMINISTERED_WITH]->(ai)
-                        """
-                        tx.run(query, brand_name=args['brand_name'], key=key, instruction=instruction)
-                
-                # Create Separate Nodes for with_what_to_take and before_or_after_food
-                if 'with_what_to_take' in args['administration_instructions'] and 'administration_instructions.with_what_to_take' not in none_fields:
-                    query = """
-                    MATCH (m:Medicine {brand_name: $brand_name})
-                    MERGE (wwt:WithWhatToTake {instruction: $instruction})
-                    MERGE (m)-[:TAKEN_WITH]->(wwt)
-                    """
-                    tx.run(query, brand_name=args['brand_name'], instruction=args['administration_instructions']['with_what_to_take'])
-
-                if 'before_or_after_food' in args['administration_instructions'] and 'administration_instructions.before_or_after_food' not in none_fields:
-                    query = """
-                    MATCH (m:Medicine {brand_name: $brand_name})
-                    MERGE (baf:BeforeOrAfterFood {instruction: $instruction})
-                    MERGE (m)-[:TAKEN_BEFORE_OR_AFTER_FOOD]->(baf)
-                    """
-                    tx.run(query, brand_name=args['brand_name'], instruction=args['administration_instructions']['before_or_after_food'])
-                
-                # Create MechanismOfAction node and relationships
-                if 'mechanism_of_action' in args and 'mechanism_of_action' not in none_fields:
-                    query = """
-                    MATCH (m:Medicine {brand_name: $brand_name})
-                    MERGE (moa:MechanismOfAction {description: $description})
-                    MERGE (m)-[:WORKS_BY]->(moa)
-                    """
-                    tx.run(query, brand_name=args['brand_name'], **args['mechanism_of_action'])
-                
-                # Create MechanismStep nodes and relationships
-                if 'detailed_steps' in args['mechanism_of_action'] and 'mechanism_of_action.detailed_steps' not in none_fields:
-                    for step in args['mechanism_of_action']['detailed_steps']:
-                        query = """
-                        MATCH (moa:MechanismOfAction)-[:WORKS_BY]-(m:Medicine {brand_name: $brand_name})
-                        MERGE (ms:MechanismStep {description: $step})
-                        MERGE (moa)-[:INVOLVES]->(ms)
-                        """
-                        tx.run(query, brand_name=args['brand_name'], step=step)
-                
-                logger.info(f"Finished processing medicine: {args['brand_name']}")
-
-                
-                # Create SideEffect nodes and relationships
-                if 'side_effects' in args and 'side_effects' not in none_fields:
-                    for effect in args['side_effects']:
-                        query = """
-                        MERGE (se:SideEffect {name: $effect})
-                        WITH se
-                        MATCH (m:Medicine {brand_name: $brand_name})
-                        MERGE (m)-[:MAY_CAUSE]->(se)
-                        """
-                        tx.run(query, brand_name=args['brand_name'], effect=effect)
-                
-                # Create DrugInteraction nodes and relationships
-                if 'drug_interactions' in args and 'drug_interactions' not in none_fields:
-                    for interaction in args['drug_interactions']:
-                        query = """
-                        MERGE (di:DrugInteraction {drug_name: $drug_name})
-                        ON CREATE SET di.interaction_type = $interaction_type, di.effects = $effects
-                        WITH di
-                        MATCH (m:Medicine {brand_name: $brand_name})
-                        MERGE (m)-[:INTERACTS_WITH]->(di)
-                        """
-                        tx.run(query, brand_name=args['brand_name'], **interaction)
-                
-                # Create StorageCondition nodes and relationships
-                if 'storage_conditions' in args['storage_and_shelf_life'] and 'storage_and_shelf_life.storage_conditions' not in none_fields:
-                    for condition in args['storage_and_shelf_life']['storage_conditions']:
-                        query = """
-                        MERGE (sc:StorageCondition {condition: $condition})
-                        WITH sc
-                        MATCH (m:Medicine {brand_name: $brand_name})
-                        MERGE (m)-[:STORED_UNDER]->(sc)
-                        """
-                        tx.run(query, brand_name=args['brand_name'], condition=condition)
-                
-                # Create ShelfLife node and relationship
-                if 'shelf_life' in args['storage_and_shelf_life'] and 'storage_and_shelf_life.shelf_life' not in none_fields:
-                    query = """
-                    MERGE (sl:ShelfLife {duration: $shelf_life})
-                    WITH sl
-                    MATCH (m:Medicine {brand_name: $brand_name})
-                    MERGE (m)-[:HAS_SHELF_LIFE]->(sl)
-                    """
-                    tx.run(query, brand_name=args['brand_name'], shelf_life=args['storage_and_shelf_life']['shelf_life'])
-                
-                logger.info(f"Finished processing medicine: {args['brand_name']}")
+                self._run(tx, query, f"stale_{family}", brand_names=brand_names)
+
+        # One statement per relationship family, regardless of how many medicines are in the batch
+        for family, query in MEDICINE_QUERIES:
+            if rows[family]:
+                self._run(tx, query, family, rows=rows[family])
+                logger.debug(f"Wrote {len(rows[family])} {family} rows")
+
+        self._run(tx, STORE_HASHES_QUERY, "content_hash", rows=hash_rows)
+        logger.info(f"Finished processing medicines: {', '.join(row['brand_name'] for row in hash_rows)}")
+        return changed
@@ -3,47 +3,222 @@ import os
 
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import asyncio
+import hashlib
+import json
 import logging
-from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
+import re
 from schemas.schemas import MedicineDetailedInfo
+from .cache import LRUCache
+from .metrics import REGISTRY
+from .normalise import name_key
+from .rate_limit import SCHEDULER, estimate_tokens
 from .prompts import INFO_PROMPT
 
-load_dotenv()
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+def _normalise_text(value):
+    return " ".join(str(value).split()).casefold() if value is not None else ""
+
+
+def _normalise_strength(value):
+    """Reduce a strength such as "650 mg" or "500mg/5ml" to its numbers ("650", "500/5")."""
+    if value is None:
+        return ""
+    return "/".join(f"{float(number):g}" for number in re.findall(r"\d+(?:\.\d+)?", str(value)))
+
+
+def medicine_identity(medicine_data):
+    """Stable key for a medicine: generic name, strength and sorted ingredient composition.
+
+    Ingredient names are keyed the way the importer's EntityNormaliser stores them, so the stored
+    "Paracetamol" matches a freshly read "Paracetamol IP".
+    """
+    args = medicine_data.get("args", medicine_data)
+    ingredients = sorted(
+        (name_key("ingredients", ingredient["name"]) if ingredient.get("name") else "",
+         _normalise_strength(ingredient.get("composition_mg")))
+        for ingredient in args.get("ingredients") or []
+    )
+    identity = {
+        "generic_name": _normalise_text(args.get("generic_name")),
+        "power_mg": _normalise_strength(args.get("power_mg")),
+        "ingredients": ingredients,
+    }
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Printed on the package rather than derived from the composition, so never taken from a cached medicine
+LABEL_FIELDS = ("brand_name", "manufacturer", "power_mg")
+
+
+def _with_label(tool_calls, medicine_data):
+    """Copy ``tool_calls`` with the label fields of the OCR'd ``medicine_data`` laid over their args."""
+    label = {field: value for field, value in medicine_data.get("args", medicine_data).items()
+             if field in LABEL_FIELDS and value is not None}
+    return [{"name": tool_call["name"], "args": {**tool_call["args"], **label}} for tool_call in tool_calls]
 
 
 class MedicineInfoGenerator:
-    def __init__(self, model_name="gpt-4o-mini", temperature=0, api_key=None):
-        """Initialize the LLM model and API key."""
+    def __init__(self, model_name="gpt-4o-mini", temperature=0, api_key=None, cache=None, graph_lookup=None,
+                 lru_size=1024, lru_ttl=None, metrics=None, scheduler=None, llm=None):
+        """Initialize the LLM model and API key.
+
+        Before calling the LLM, medicines are looked up by medicine_identity in an in-process LRU,
+        then in the optional persistent ``cache`` (SQLiteCache), then through ``graph_lookup``, a
+        callable taking a generic name and returning stored MedicineDetailedInfo args
+        (e.g. MedicineDataImporter.find_medicine_data). ``metrics`` defaults to the shared REGISTRY.
+        Every LLM call goes through ``scheduler``, the shared LLMScheduler by default.
+        Pass ``llm`` to reuse a chat model (e.g. the OCR extractor's); by default one is built lazily.
+        """
         self.api_key = api_key
-        if not self.api_key:
+        if not self.api_key and llm is None:
             logging.error("OPENAI_API_KEY is missing from the environment variables.")
             raise ValueError("OPENAI_API_KEY is required.")
-        
-        os.environ["OPENAI_API_KEY"] = self.api_key
-        self.llm = ChatOpenAI(model=model_name, temperature=temperature)
 
-    def generate_medicine_info(self, medicine_data):
-        """Generate detailed medicine information from structured OCR data."""
+        if self.api_key:
+            os.environ["OPENAI_API_KEY"] = self.api_key
+        self.scheduler = scheduler or SCHEDULER
+        self.model_name = model_name
+        self.temperature = temperature
+        self._llm = llm
+        self.lru = LRUCache(max_entries=lru_size, ttl=lru_ttl)
+        self.cache = cache
+        self.graph_lookup = graph_lookup
+        self.metrics = metrics or REGISTRY
+
+    @property
+    def llm(self):
+        """The injected chat model, or a ChatOpenAI client built on first access."""
+        if self._llm is None:
+            from langchain_openai import ChatOpenAI
+            # Retries are owned by the scheduler so they share its backoff and rate limits
+            self._llm = ChatOpenAI(model=self.model_name, temperature=self.temperature, max_retries=0)
+        return self._llm
+
+    def lookup_medicine_info(self, medicine_data):
+        """Return known MedicineDetailedInfo tool calls for this medicine, or None if it has to be generated.
+
+        medicine_identity ignores the brand, so the brand name, manufacturer and strength of a hit
+        are always those read from this package.
+        """
+        tool_calls = self._lookup(medicine_data)
+        return _with_label(tool_calls, medicine_data) if tool_calls is not None else None
+
+    def _lookup(self, medicine_data):
+        key = medicine_identity(medicine_data)
+
+        tool_calls = self.lru.get(key)
+        self.metrics.record_cache("details_lru", tool_calls is not None)
+        if tool_calls is not None:
+            logging.info("Medicine detailed information served from in-process cache.")
+            return tool_calls
+
+        if self.cache is not None:
+            tool_calls = self.cache.get(key)
+            self.metrics.record_cache("details_persistent", tool_calls is not None)
+            if tool_calls is not None:
+                logging.info("Medicine detailed information served from persistent cache.")
+                self.lru.set(key, tool_calls)
+                return tool_calls
+
+        if self.graph_lookup is not None:
+            generic_name = medicine_data.get("args", medicine_data).get("generic_name")
+            try:
+                candidates = self.graph_lookup(generic_name) if generic_name else []
+            except Exception as e:
+                logging.warning(f"Graph lookup failed, falling back to generation: {e}")
+                candidates = []
+            for args in candidates:
+                if medicine_identity(args) == key:
+                    logging.info("Medicine detailed information served from graph.")
+                    self.metrics.record_cache("details_graph", True)
+                    tool_calls = [{"name": "MedicineDetailedInfo", "args": args}]
+                    self._remember(key, tool_calls)
+                    return tool_calls
+            self.metrics.record_cache("details_graph", False)
+
+        return None
+
+    def _remember(self, key, tool_calls):
+        if not tool_calls:
+            return
+        tool_calls = [{"name": tool_call["name"], "args": tool_call["args"]} for tool_call in tool_calls]
+        self.lru.set(key, tool_calls)
+        if self.cache is not None:
+            self.cache.set(key, tool_calls)
+
+    @staticmethod
+    def _build_message(medicine_data):
+        """Build the enrichment request message for structured OCR data."""
+        from langchain_core.messages import HumanMessage
+
+        return HumanMessage(
+            content=[
+                {"type": "text", "text": INFO_PROMPT},
+                {"type": "text", "text": f"{medicine_data}"},
+            ]
+        )
+
+    def _generate(self, medicine_data, refresh):
+        if not refresh:
+            known = self.lookup_medicine_info(medicine_data)
+            if known is not None:
+                return known
+
+        message = self._build_message(medicine_data)
+
+        llm_with_tools = self.llm.bind_tools([MedicineDetailedInfo])
+        tokens = estimate_tokens(message.content, completion_tokens=1500)
+        response = self.scheduler.call(llm_with_tools.invoke, [message], tokens=tokens)
+        self.metrics.record_llm_usage("enrichment", response)
+
+        logging.info("Medicine detailed information generation successful.")
+        self._remember(medicine_identity(medicine_data), response.tool_calls)
+        return response.tool_calls
+
+    async def _agenerate(self, medicine_data, refresh):
+        if not refresh:
+            known = await asyncio.to_thread(self.lookup_medicine_info, medicine_data)
+            if known is not None:
+                return known
+
+        message = self._build_message(medicine_data)
+
+        llm_with_tools = self.llm.bind_tools([MedicineDetailedInfo])
+        tokens = estimate_tokens(message.content, completion_tokens=1500)
+        response = await self.scheduler.acall(llm_with_tools.ainvoke, [message], tokens=tokens)
+        self.metrics.record_llm_usage("enrichment", response)
+
+        logging.info("Medicine detailed information generation successful.")
+        await asyncio.to_thread(self._remember, medicine_identity(medicine_data), response.tool_calls)
+        return response.tool_calls
+
+    def generate_medicine_info(self, medicine_data, refresh=False, raise_errors=False):
+        """Generate detailed medicine information from structured OCR data.
+
+        Known medicines are served by lookup_medicine_info; pass ``refresh=True`` to regenerate them.
+        Failures are logged and return None, or are re-raised with ``raise_errors``.
+        """
         try:
-            message = HumanMessage(
-                content=[
-                    {"type": "text", "text": INFO_PROMPT},
-                    {"type": "text", "text": f"{medicine_data}"},
-                ]
-            )
+            with self.metrics.timer("enrichment"):
+                return self._generate(medicine_data, refresh)
 
-            llm_with_tools = self.llm.bind_tools([MedicineDetailedInfo])
-            response = llm_with_tools.invoke([message])
+        except Exception as e:
+            logging.error(f"Failed to generate medicine information: {e}")
+            if raise_errors:
+                raise
+            return None
 
-            logging.info("Medicine detailed information generation successful.")
-            return response.tool_calls
+    async def agenerate_medicine_info(self, medicine_data, refresh=False, raise_errors=False):
+        """Async counterpart of generate_medicine_info using the model's ainvoke."""
+        try:
+            with self.metrics.timer("enrichment"):
+                return await self._agenerate(medicine_data, refresh)
 
         except Exception as e:
             logging.error(f"Failed to generate medicine information: {e}")
+            if raise_errors:
+                raise
             return None
 
 
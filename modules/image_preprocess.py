@@ -0,0 +1,127 @@
+import io
+import logging
+from dataclasses import dataclass
+
+# Pillow is optional and only needed when preprocessing is enabled, so it is imported by _load_pillow
+Image = ImageChops = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+
+def _load_pillow():
+    global Image, ImageChops, ImageOps
+    if Image is None:
+        try:
+            from PIL import Image, ImageChops, ImageOps
+        except ImportError:
+            raise ImportError("Pillow is required for image preprocessing: pip install Pillow") from None
+
+_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def detect_mime_type(image_bytes):
+    """Detect the MIME type of an image from its magic bytes, defaulting to image/jpeg."""
+    for signature, mime_type in _SIGNATURES:
+        if image_bytes.startswith(signature):
+            return mime_type
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    if image_bytes[4:8] == b"ftyp" and image_bytes[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    return "image/jpeg"
+
+
+@dataclass
+class PreprocessedImage:
+    data: bytes
+    mime_type: str
+    original_bytes: int
+
+    @property
+    def processed_bytes(self):
+        return len(self.data)
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - self.processed_bytes
+
+
+class ImagePreprocessor:
+    """Shrinks images before they are base64-encoded for the vision model.
+
+    Applies EXIF rotation, optional crop (an explicit ``crop_box`` or ``crop_to_label`` to trim a
+    uniform background), optional grayscale, downscaling so the longest edge is at most ``max_edge``
+    and re-encoding as JPEG at ``quality``. The original bytes are kept if re-encoding does not
+    make them smaller.
+    """
+
+    def __init__(self, max_edge=1568, quality=85, grayscale=False, crop_box=None, crop_to_label=False):
+        _load_pillow()
+        self.max_edge = max_edge
+        self.quality = quality
+        self.grayscale = grayscale
+        self.crop_box = crop_box
+        self.crop_to_label = crop_to_label
+
+    def cache_token(self):
+        """Settings that affect the output, for use in cache keys."""
+        return f"{self.max_edge}:{self.quality}:{self.grayscale}:{self.crop_box}:{self.crop_to_label}"
+
+    @staticmethod
+    def _label_box(image, threshold=24, margin=0.02):
+        """Bounding box of whatever differs from the top-left corner colour, padded by ``margin``."""
+        gray = image.convert("L")
+        background = Image.new("L", gray.size, gray.getpixel((0, 0)))
+        mask = ImageChops.difference(gray, background).point(lambda value: 255 if value > threshold else 0)
+        box = mask.getbbox()
+        if box is None:
+            return None
+        pad_x, pad_y = int(image.width * margin), int(image.height * margin)
+        return (
+            max(box[0] - pad_x, 0),
+            max(box[1] - pad_y, 0),
+            min(box[2] + pad_x, image.width),
+            min(box[3] + pad_y, image.height),
+        )
+
+    def process(self, image_bytes):
+        """Return the shrunk image, or the original bytes if Pillow cannot decode them (HEIC, truncated upload)."""
+        try:
+            return self._process(image_bytes)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            logger.warning(f"Could not preprocess image, sending the original: {e}")
+            return PreprocessedImage(image_bytes, detect_mime_type(image_bytes), len(image_bytes))
+
+    def _process(self, image_bytes):
+        with Image.open(io.BytesIO(image_bytes)) as opened:
+            image = ImageOps.exif_transpose(opened)
+
+        if self.crop_box:
+            image = image.crop(self.crop_box)
+        elif self.crop_to_label:
+            box = self._label_box(image)
+            if box:
+                image = image.crop(box)
+
+        image = image.convert("L") if self.grayscale else image.convert("RGB")
+
+        if self.max_edge and max(image.size) > self.max_edge:
+            image.thumbnail((self.max_edge, self.max_edge), Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=self.quality, optimize=True)
+        data = buffer.getvalue()
+
+        if len(data) >= len(image_bytes):
+            logger.info("Preprocessing did not shrink the image, sending the original.")
+            return PreprocessedImage(image_bytes, detect_mime_type(image_bytes), len(image_bytes))
+
+        result = PreprocessedImage(data, "image/jpeg", len(image_bytes))
+        logger.info(f"Image preprocessed from {result.original_bytes} to {result.processed_bytes} bytes "
+                    f"({result.bytes_saved} saved).")
+        return result
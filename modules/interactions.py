@@ -0,0 +1,142 @@
+import logging
+from itertools import combinations
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_PROFILE_COLUMNS = """
+       m.brand_name AS brand_name,
+       m.generic_name AS generic_name,
+       [(m)-[:CONTAINS]->(i:Ingredient) | toLower(i.name)] AS ingredients,
+       [(m)-[r:INTERACTS_WITH]->(di:DrugInteraction) | {drug_name: di.drug_name,
+        interaction_type: coalesce(r.interaction_type, di.interaction_type),
+        effects: coalesce(r.effects, di.effects)}] AS interactions
+"""
+
+# Resolves every requested name and returns its ingredients and interactions in one round trip
+INTERACTION_PROFILES_QUERY = """
+UNWIND $names AS name
+MATCH (m:Medicine)
+WHERE m.brand_name_lower = name OR m.generic_name_lower = name
+RETURN name,""" + _PROFILE_COLUMNS
+
+ALL_INTERACTION_PROFILES_QUERY = """
+MATCH (m:Medicine)
+RETURN""" + _PROFILE_COLUMNS
+
+
+def _lower(value):
+    return str(value).strip().lower() if value else None
+
+
+class InteractionChecker:
+    """Checks a list of medicines for pairwise and ingredient-level interactions.
+
+    ``query(cypher, params)`` runs a read query and returns a list of dicts; both
+    ``Neo4jGraph.query`` and ``MedicineDataImporter.query`` fit. With ``use_index`` the
+    interaction profiles of every medicine are held in memory and checks make no graph
+    round trip at all; register ``on_import`` as an import listener to keep it current.
+    """
+
+    def __init__(self, query, use_index=False, metrics=None):
+        self.query = query
+        self.metrics = metrics or REGISTRY
+        self.use_index = use_index
+        self._by_brand = {}
+        self._index = {}
+        if use_index:
+            self.refresh_index()
+
+    def refresh_index(self, names=None):
+        """Reload the in-memory profiles, of every medicine or only of those matching ``names``."""
+        if names is None:
+            rows = self.query(ALL_INTERACTION_PROFILES_QUERY, {})
+            self._by_brand = {}
+        else:
+            rows = self.query(INTERACTION_PROFILES_QUERY, {"names": sorted({_lower(name) for name in names if name})})
+        for row in rows:
+            self._by_brand[row["brand_name"]] = {key: row[key] for key in
+                                                 ("brand_name", "generic_name", "ingredients", "interactions")}
+
+        index = {}
+        for profile in self._by_brand.values():
+            for key in {_lower(profile["brand_name"]), _lower(profile["generic_name"])} - {None}:
+                index.setdefault(key, []).append(profile)
+        self._index = index
+        logger.info(f"Interaction index holds {len(self._by_brand)} medicines")
+
+    def on_import(self, names):
+        """Import listener: refresh the indexed profiles of the imported medicines."""
+        if self.use_index:
+            self.refresh_index(names)
+
+    def _profiles(self, names):
+        if self.use_index:
+            self.metrics.inc("pillbuddy_interaction_checks_total", source="index")
+            return {name: self._index.get(name, []) for name in names}
+        self.metrics.inc("pillbuddy_interaction_checks_total", source="graph")
+        profiles = {name: [] for name in names}
+        for row in self.query(INTERACTION_PROFILES_QUERY, {"names": names}):
+            profiles[row["name"]].append(row)
+        return profiles
+
+    @staticmethod
+    def _merge(name, profiles):
+        """Fold every medicine a name resolved to (a generic name can match several brands) into one entry."""
+        interactions = {}
+        for profile in profiles:
+            for interaction in profile["interactions"] or []:
+                key = (_lower(interaction.get("drug_name")), interaction.get("interaction_type"), interaction.get("effects"))
+                interactions.setdefault(key, interaction)
+        return {
+            "name": name,
+            "brand_names": sorted({profile["brand_name"] for profile in profiles if profile["brand_name"]}),
+            "aliases": {name} | {_lower(profile[key]) for profile in profiles
+                                 for key in ("brand_name", "generic_name") if profile[key]},
+            "ingredients": {ingredient for profile in profiles for ingredient in profile["ingredients"] or [] if ingredient},
+            "interactions": list(interactions.values()),
+        }
+
+    def check(self, medicines):
+        """Return every interaction between the given brand or generic names.
+
+        The result holds ``medicines`` (name -> matched brand names), ``unresolved`` names,
+        ``interactions`` (one entry per stored interaction of ``medicine`` whose drug is
+        ``other`` itself, ``level`` "medicine", or one of its ingredients, ``level``
+        "ingredient") and ``shared_ingredients`` between pairs of medicines.
+        """
+        names = list(dict.fromkeys(name for name in map(_lower, medicines) if name))
+        with self.metrics.timer("interactions", medicines=len(names)):
+            profiles = self._profiles(names)
+            merged = [self._merge(name, profiles[name]) for name in names if profiles[name]]
+
+            interactions = []
+            shared_ingredients = []
+            for first, second in combinations(merged, 2):
+                for medicine, other in ((first, second), (second, first)):
+                    for interaction in medicine["interactions"]:
+                        drug_name = _lower(interaction.get("drug_name"))
+                        if drug_name in other["aliases"]:
+                            level = "medicine"
+                        elif drug_name in other["ingredients"]:
+                            level = "ingredient"
+                        else:
+                            continue
+                        interactions.append({
+                            "medicine": medicine["name"],
+                            "other": other["name"],
+                            "level": level,
+                            "drug_name": interaction.get("drug_name"),
+                            "interaction_type": interaction.get("interaction_type"),
+                            "effects": interaction.get("effects"),
+                        })
+                common = first["ingredients"] & second["ingredients"]
+                if common:
+                    shared_ingredients.append({"medicines": [first["name"], second["name"]], "ingredients": sorted(common)})
+
+        return {
+            "medicines": {entry["name"]: entry["brand_names"] for entry in merged},
+            "unresolved": [name for name in names if not profiles[name]],
+            "interactions": interactions,
+            "shared_ingredients": shared_ingredients,
+        }
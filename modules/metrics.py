@@ -0,0 +1,156 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class SpanRecorder:
+    """Minimal OpenTelemetry-style tracer that keeps finished spans in memory."""
+
+    def __init__(self, max_spans=10000):
+        self.max_spans = max_spans
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def start_as_current_span(self, name, attributes=None):
+        span = {"name": name, "attributes": dict(attributes or {}), "start": time.time()}
+        started = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span["duration"] = time.perf_counter() - started
+            with self._lock:
+                self.spans.append(span)
+                del self.spans[:-self.max_spans]
+
+
+def opentelemetry_tracer(name="pillbuddy"):
+    """Return an OpenTelemetry tracer if the opentelemetry package is installed, otherwise None."""
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        return None
+    return trace.get_tracer(name)
+
+
+class MetricsRegistry:
+    """In-process counters and histograms with a Prometheus text exporter.
+
+    ``tracer`` is anything with an OpenTelemetry-style ``start_as_current_span(name, attributes=...)``,
+    such as SpanRecorder or opentelemetry_tracer(); when set, every stage timer also opens a span.
+    """
+
+    def __init__(self, tracer=None, buckets=DEFAULT_BUCKETS):
+        self.tracer = tracer
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+
+    def counter_value(self, name, **labels):
+        return self._counters.get((name, _label_key(labels)), 0)
+
+    @contextmanager
+    def timer(self, stage, **attributes):
+        """Time a pipeline stage into pillbuddy_stage_seconds and, if a tracer is set, a span."""
+        span = (self.tracer.start_as_current_span(f"pillbuddy.{stage}", attributes=attributes)
+                if self.tracer is not None else nullcontext())
+        started = time.perf_counter()
+        status = "ok"
+        with span:
+            try:
+                yield
+            except BaseException:
+                status = "error"
+                raise
+            finally:
+                self.observe("pillbuddy_stage_seconds", time.perf_counter() - started, stage=stage)
+                self.inc("pillbuddy_stage_runs_total", stage=stage, status=status)
+
+    def record_llm_usage(self, stage, response):
+        """Count prompt and completion tokens from a chat model response's usage_metadata."""
+        self.record_token_usage(stage, getattr(response, "usage_metadata", None) or {})
+
+    def record_token_usage(self, stage, usage):
+        """Count tokens from a usage dict with ``input_tokens`` and ``output_tokens``."""
+        if usage.get("input_tokens"):
+            self.inc("pillbuddy_llm_tokens_total", usage["input_tokens"], stage=stage, kind="prompt")
+        if usage.get("output_tokens"):
+            self.inc("pillbuddy_llm_tokens_total", usage["output_tokens"], stage=stage, kind="completion")
+
+    def record_cache(self, cache, hit):
+        self.inc("pillbuddy_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+    def to_prometheus(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+
+        seen = set()
+        for (name, key), value in counters:
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(key)} {value}")
+
+        for (name, key), histogram in histograms:
+            if name not in seen:
+                lines.append(f"# TYPE {name} histogram")
+                seen.add(name)
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', str(bound))])} {count}")
+            lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {histogram.count}")
+            lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared registry used by components that are not given their own
+REGISTRY = MetricsRegistry()
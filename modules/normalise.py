@@ -0,0 +1,206 @@
+import difflib
+import logging
+import re
+import threading
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Import row family -> (label, key property) of the shared node its items are merged on
+ENTITY_FAMILIES = {
+    "ingredients": ("Ingredient", "name"),
+    "uses": ("Use", "name"),
+    "overdose_effects": ("OverdoseEffect", "name"),
+    "detailed_steps": ("MechanismStep", "description"),
+    "side_effects": ("SideEffect", "name"),
+    "drug_interactions": ("DrugInteraction", "drug_name"),
+    "storage_conditions": ("StorageCondition", "condition"),
+}
+
+# Item field holding the name, for families whose items are dicts
+_ITEM_FIELDS = {"ingredients": "name", "drug_interactions": "drug_name"}
+
+ENTITY_NAMES_QUERY = "\nUNION ALL\n".join(
+    f"MATCH (n:{label}) WHERE n.{prop} IS NOT NULL RETURN '{family}' AS family, n.{prop} AS name"
+    for family, (label, prop) in ENTITY_FAMILIES.items()
+)
+
+# Case-folded variant -> canonical name, per family
+SYNONYMS = {
+    "ingredients": {
+        "acetaminophen": "Paracetamol",
+        "apap": "Paracetamol",
+        "acetylsalicylic acid": "Aspirin",
+        "vitamin c": "Ascorbic acid",
+    },
+    "drug_interactions": {
+        "acetaminophen": "Paracetamol",
+        "acetylsalicylic acid": "Aspirin",
+        "ethanol": "Alcohol",
+        "alcoholic beverages": "Alcohol",
+        "coumadin": "Warfarin",
+    },
+    "uses": {
+        "high fever": "Fever",
+        "mild fever": "Fever",
+        "pyrexia": "Fever",
+        "high temperature": "Fever",
+        "headaches": "Headache",
+        "body ache": "Body pain",
+        "body aches": "Body pain",
+        "common cold": "Cold",
+        "tooth ache": "Toothache",
+        "dental pain": "Toothache",
+    },
+    "side_effects": {
+        "feeling sick": "Nausea",
+        "nauseous": "Nausea",
+        "skin rash": "Rash",
+        "dizzy": "Dizziness",
+        "sleepiness": "Drowsiness",
+        "upset stomach": "Stomach upset",
+        "gastric upset": "Stomach upset",
+    },
+}
+SYNONYMS["overdose_effects"] = SYNONYMS["side_effects"]
+
+# Drug names that differ by a couple of letters are often different drugs, so only near-typos merge.
+# Free-text families are never fuzzy-matched: "Hepatitis B" and "Hepatitis C" are a letter apart, as
+# are "Store in a cool, dry place" and "Store in a cool, dark place".
+FUZZY_CUTOFFS = {
+    "ingredients": 0.95,
+    "drug_interactions": 0.95,
+    "uses": None,
+    "side_effects": None,
+    "overdose_effects": None,
+    "storage_conditions": None,
+    "detailed_steps": None,
+}
+
+# Numbers and single-letter tokens ("Type 2", "Vitamin B1", "Influenza A") must agree for a fuzzy match
+_EXACT_TOKENS = re.compile(r"\d+(?:\.\d+)?|\b[^\W\d_]\b")
+
+# Pharmacopoeia grades printed after ingredient names ("Paracetamol IP")
+_GRADE_SUFFIX = re.compile(r"\s+(ip|bp|usp|ph\.?\s*eur\.?)$", re.I)
+
+
+def clean(value):
+    """Collapse whitespace, strip trailing full stops and capitalise all-lowercase names."""
+    value = " ".join(str(value).split()).rstrip(".")
+    if value.islower():
+        value = value[0].upper() + value[1:]
+    return value
+
+
+def _name_key(family, value):
+    key = clean(value).casefold()
+    if family in _ITEM_FIELDS:
+        key = _GRADE_SUFFIX.sub("", key)
+    return key
+
+
+def name_key(family, value, synonyms=SYNONYMS):
+    """Case-folded key ``value`` resolves to without the graph: cleaned, grade suffix dropped, synonyms applied."""
+    key = _name_key(family, value)
+    synonym = synonyms.get(family, {}).get(key)
+    return _name_key(family, synonym) if synonym else key
+
+
+class EntityNormaliser:
+    """Maps extracted names onto the names already in the graph before they are MERGEd.
+
+    Each name is cleaned, then resolved by case-folded exact match, the family's synonym table and
+    finally difflib fuzzy matching (ratio >= ``cutoff``, or FUZZY_CUTOFFS per family, where None
+    disables it) against an in-memory index of existing names. Fuzzy matches must also agree on every
+    number and single-letter token. Unmatched names become canonical themselves. The index is loaded
+    once through ``loader(cypher, params)`` (e.g. MedicineDataImporter.query) and grows as names are
+    resolved.
+    """
+
+    def __init__(self, loader=None, synonyms=None, cutoff=0.9, metrics=None):
+        self.loader = loader
+        self.synonyms = {family: dict(table) for family, table in (synonyms or SYNONYMS).items()}
+        self.cutoff = cutoff
+        self.metrics = metrics or REGISTRY
+        self._index = {family: {} for family in ENTITY_FAMILIES}
+        self._buckets = {family: {} for family in ENTITY_FAMILIES}
+        self._loaded = loader is None
+        self._lock = threading.RLock()
+
+    def _add(self, family, key, canonical):
+        if key not in self._index[family]:
+            self._index[family][key] = canonical
+            self._buckets[family].setdefault(key[:1], []).append(key)
+
+    def load(self):
+        """(Re)load the index from the graph."""
+        with self._lock:
+            self._index = {family: {} for family in ENTITY_FAMILIES}
+            self._buckets = {family: {} for family in ENTITY_FAMILIES}
+            rows = self.loader(ENTITY_NAMES_QUERY, {}) if self.loader else []
+            for row in rows:
+                if row["name"]:
+                    self._add(row["family"], self._key(row["family"], row["name"]), row["name"])
+            self._loaded = True
+        logger.info(f"Entity index loaded {len(rows)} names")
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    _key = staticmethod(_name_key)
+
+    def _fuzzy_match(self, family, key):
+        cutoff = FUZZY_CUTOFFS.get(family, self.cutoff)
+        if cutoff is None:
+            return None
+        tokens = _EXACT_TOKENS.findall(key)
+        candidates = [candidate for candidate in self._buckets[family].get(key[:1], [])
+                      if _EXACT_TOKENS.findall(candidate) == tokens]
+        close = difflib.get_close_matches(key, candidates, n=1, cutoff=cutoff)
+        return close[0] if close else None
+
+    def canonical(self, family, value):
+        """Return the canonical name for ``value`` in ``family`` (a key of ENTITY_FAMILIES)."""
+        if family not in ENTITY_FAMILIES or not isinstance(value, str) or not value.strip():
+            return value
+        self.ensure_loaded()
+        key = self._key(family, value)
+        with self._lock:
+            index = self._index[family]
+            if key in index:
+                match = "exact"
+            elif key in self.synonyms.get(family, {}):
+                match = "synonym"
+                synonym = self.synonyms[family][key]
+                self._add(family, self._key(family, synonym), synonym)
+                index[key] = index[self._key(family, synonym)]
+            else:
+                close = self._fuzzy_match(family, key)
+                if close is not None:
+                    match = "fuzzy"
+                    index[key] = index[close]
+                else:
+                    match = "new"
+                    self._add(family, key, _GRADE_SUFFIX.sub("", clean(value)) if family in _ITEM_FIELDS else clean(value))
+            canonical = index[key]
+        self.metrics.inc("pillbuddy_entities_normalised_total", family=family, match=match)
+        return canonical
+
+    def normalise_rows(self, rows):
+        """Canonicalise the item names of import rows (family -> [{"items": [...]}, ...]) in place."""
+        for family, family_rows in rows.items():
+            if family not in ENTITY_FAMILIES:
+                continue
+            field = _ITEM_FIELDS.get(family)
+            for row in family_rows:
+                items = {}
+                for item in row["items"]:
+                    if field is None:
+                        item = self.canonical(family, item)
+                        items.setdefault(item, item)
+                    else:
+                        item = {**item, field: self.canonical(family, item[field])}
+                        items[item[field]] = item
+                row["items"] = list(items.values())
+        return rows
@@ -3,30 +3,126 @@ import os
 
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import asyncio
 import base64
+import hashlib
 import logging
-from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
 from schemas.schemas import MedicineOCRData
-from .prompts import OCR_PROMPT
+from .image_preprocess import detect_mime_type
+from .metrics import REGISTRY
+from .rate_limit import SCHEDULER, estimate_tokens
+from .prompts import OCR_MULTI_IMAGE_PROMPT, OCR_PROMPT
 
 
-load_dotenv()
+# Prompt, a high-detail image (~1,100 tokens) and the tool-call completion
+OCR_TOKEN_ESTIMATE = estimate_tokens(OCR_PROMPT, completion_tokens=1600)
+OCR_EXTRA_IMAGE_TOKENS = 1100
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+def _image_list(images):
+    """Accept one image (path or bytes) or a list of them and always return a list."""
+    return list(images) if isinstance(images, (list, tuple)) else [images]
+
+
+def _key(value):
+    return " ".join(str(value).casefold().split()) if value not in (None, "") else None
+
+
+def _reconcile(values):
+    """Most common non-empty value, ties going to the first seen; None if every value is empty."""
+    counts = {}
+    for value in values:
+        if value not in (None, "", []):
+            counts.setdefault(_key(value), [0, value])[0] += 1
+    return max(counts.values(), key=lambda entry: entry[0])[1] if counts else None
+
+
+def merge_ocr_data(tool_calls):
+    """Merge the MedicineOCRData tool calls extracted from photos of one package into a single call.
+
+    Scalar fields take the most common non-empty value, ingredients are the union by name (with the
+    most common non-empty composition) and storage conditions the union of all images. Returns a
+    one-element list like extract_medicine_info, or None if there is nothing to merge.
+    """
+    payloads = [tool_call["args"] for tool_call in tool_calls or [] if tool_call.get("name") == "MedicineOCRData"]
+    if not payloads:
+        return None
+    if len(payloads) == 1:
+        return [{"name": "MedicineOCRData", "args": payloads[0]}]
+
+    merged = {
+        field: _reconcile(args.get(field) for args in payloads)
+        for field in ("generic_name", "brand_name", "manufacturer", "power_mg")
+    }
+
+    ingredients = {}
+    for args in payloads:
+        for ingredient in args.get("ingredients") or []:
+            if _key(ingredient.get("name")):
+                ingredients.setdefault(_key(ingredient["name"]), []).append(ingredient)
+    merged["ingredients"] = [
+        {
+            "name": _reconcile(item.get("name") for item in items),
+            "composition_mg": _reconcile(item.get("composition_mg") for item in items),
+        }
+        for items in ingredients.values()
+    ]
+
+    storage = [args.get("storage_and_shelf_life") or {} for args in payloads]
+    conditions = {}
+    for entry in storage:
+        for condition in entry.get("storage_conditions") or []:
+            conditions.setdefault(_key(condition), condition)
+    merged["storage_and_shelf_life"] = {
+        "storage_conditions": list(conditions.values()) or None,
+        "shelf_life": _reconcile(entry.get("shelf_life") for entry in storage),
+    }
+    return [{"name": "MedicineOCRData", "args": merged}]
+
+
+def package_ocr_data(images, tool_calls):
+    """The OCR tool calls for ``images``: merged into one when a list of photos of one package was passed,
+    otherwise as extracted, since a single photo may show several different medicines."""
+    if isinstance(images, (list, tuple)):
+        return merge_ocr_data(tool_calls)
+    return tool_calls
 
 
 class MedicineOCRExtractor:
-    def __init__(self, model_name="gpt-4o-mini", temperature=0, api_key=None):
-        """Initialize the LLM model and API key."""
+    def __init__(self, model_name="gpt-4o-mini", temperature=0, api_key=None, cache=None, preprocessor=None,
+                 metrics=None, scheduler=None, llm=None):
+        """Initialize the LLM model and API key.
+
+        ``cache`` is an optional SQLiteCache; extraction results for byte-identical images are served from it.
+        ``preprocessor`` is an optional ImagePreprocessor applied to images before they are encoded.
+        ``metrics`` is the MetricsRegistry to record into, the shared REGISTRY by default.
+        Every LLM call goes through ``scheduler``, the shared LLMScheduler by default.
+        ``llm`` is an optional chat model to share with other components; otherwise a ChatOpenAI
+        client is created on first use.
+        """
         self.api_key = api_key
-        if not self.api_key:
+        if not self.api_key and llm is None:
             logging.error("OPENAI_API_KEY is missing from the environment variables.")
             raise ValueError("OPENAI_API_KEY is required.")
-        
-        os.environ["OPENAI_API_KEY"] = self.api_key
-        self.llm = ChatOpenAI(model=model_name, temperature=temperature)
+
+        if self.api_key:
+            os.environ["OPENAI_API_KEY"] = self.api_key
+        self.model_name = model_name
+        self.cache = cache
+        self.preprocessor = preprocessor
+        self.metrics = metrics or REGISTRY
+        self.scheduler = scheduler or SCHEDULER
+        self.temperature = temperature
+        self._llm = llm
+
+    @property
+    def llm(self):
+        """The chat model, created on first use so importing and constructing stay cheap."""
+        if self._llm is None:
+            from langchain_openai import ChatOpenAI
+            # Retries are owned by the scheduler so they share its backoff and rate limits
+            self._llm = ChatOpenAI(model=self.model_name, temperature=self.temperature, max_retries=0)
+        return self._llm
 
     @staticmethod
     def encode_image(image_path):
@@ -40,26 +136,140 @@ class MedicineOCRExtractor:
             logging.error(f"Error encoding image: {e}")
             raise
 
-    def extract_medicine_info(self, image_path):
-        """Extract medicine information from an image using the LLM model."""
+    def cache_key(self, image_bytes):
+        """Content address of an extraction: image bytes (one image or a list), model and prompt."""
+        images = _image_list(image_bytes)
+        digest = hashlib.sha256()
+        if len(images) == 1:
+            digest.update(images[0])
+        else:
+            # Photos of one package may arrive in any order
+            for image_digest in sorted(hashlib.sha256(image).digest() for image in images):
+                digest.update(image_digest)
+            digest.update(OCR_MULTI_IMAGE_PROMPT.encode("utf-8"))
+        digest.update(self.model_name.encode("utf-8"))
+        digest.update(OCR_PROMPT.encode("utf-8"))
+        if self.preprocessor is not None:
+            digest.update(self.preprocessor.cache_token().encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _read_image(image_path):
+        """Read one image, or a list of bytes for a list of paths."""
+        if isinstance(image_path, (list, tuple)):
+            return [MedicineOCRExtractor._read_image(path) for path in image_path]
+        with open(image_path, "rb") as image_file:
+            return image_file.read()
+
+    def _image_content(self, image_bytes):
+        if self.preprocessor is not None:
+            processed = self.preprocessor.process(image_bytes)
+            image_bytes, mime_type = processed.data, processed.mime_type
+        else:
+            mime_type = detect_mime_type(image_bytes)
+        image_base64 = base64.b64encode(image_bytes).decode("utf-8")
+        self.metrics.inc("pillbuddy_image_bytes_sent_total", len(image_base64))
+        return {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{image_base64}"}}
+
+    def _build_message(self, image_bytes):
+        """Build the vision request message for raw image bytes (one image or a list), preprocessing them if configured."""
+        from langchain_core.messages import HumanMessage
+
+        images = _image_list(image_bytes)
+        content = [{"type": "text", "text": OCR_PROMPT}]
+        if len(images) > 1:
+            content.append({"type": "text", "text": OCR_MULTI_IMAGE_PROMPT})
+        content.extend(self._image_content(image) for image in images)
+        return HumanMessage(content=content)
+
+    @staticmethod
+    def _token_estimate(image_bytes):
+        return OCR_TOKEN_ESTIMATE + OCR_EXTRA_IMAGE_TOKENS * (len(_image_list(image_bytes)) - 1)
+
+    def _cached_result(self, key):
+        if self.cache is None:
+            return None
+        tool_calls = self.cache.get(key)
+        self.metrics.record_cache("ocr", tool_calls is not None)
+        if tool_calls is not None:
+            logging.info("Medicine information served from OCR cache.")
+        return tool_calls
+
+    def _store_result(self, key, tool_calls):
+        """Cache the tool calls once every MedicineOCRData payload validates against the schema."""
+        if self.cache is None or not tool_calls:
+            return
         try:
-            image_base64 = self.encode_image(image_path)
+            for tool_call in tool_calls:
+                MedicineOCRData(**tool_call["args"])
+        except Exception as e:
+            logging.warning(f"Not caching invalid OCR result: {e}")
+            return
+        self.cache.set(key, [{"name": tool_call["name"], "args": tool_call["args"]} for tool_call in tool_calls])
+
+    def _extract(self, image_path):
+        image_bytes = self._read_image(image_path)
+        key = self.cache_key(image_bytes)
+        cached = self._cached_result(key)
+        if cached is not None:
+            return cached
+
+        message = self._build_message(image_bytes)
+
+        llm_with_tools = self.llm.bind_tools([MedicineOCRData])
+        response = self.scheduler.call(llm_with_tools.invoke, [message], tokens=self._token_estimate(image_bytes))
+        self.metrics.record_llm_usage("ocr", response)
+
+        logging.info("Medicine information extraction successful.")
+        self._store_result(key, response.tool_calls)
+        return response.tool_calls
 
-            message = HumanMessage(
-                content=[
-                    {"type": "text", "text": OCR_PROMPT},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}},
-                ]
-            )
+    async def _aextract(self, image_path):
+        image_bytes = await asyncio.to_thread(self._read_image, image_path)
+        key = self.cache_key(image_bytes)
+        cached = await asyncio.to_thread(self._cached_result, key)
+        if cached is not None:
+            return cached
 
-            llm_with_tools = self.llm.bind_tools([MedicineOCRData])
-            response = llm_with_tools.invoke([message])
+        message = await asyncio.to_thread(self._build_message, image_bytes)
 
-            logging.info("Medicine information extraction successful.")
-            return response.tool_calls
+        llm_with_tools = self.llm.bind_tools([MedicineOCRData])
+        response = await self.scheduler.acall(
+            llm_with_tools.ainvoke, [message], tokens=self._token_estimate(image_bytes)
+        )
+        self.metrics.record_llm_usage("ocr", response)
+
+        logging.info("Medicine information extraction successful.")
+        await asyncio.to_thread(self._store_result, key, response.tool_calls)
+        return response.tool_calls
+
+    def extract_medicine_info(self, image_path, raise_errors=False):
+        """Extract medicine information from an image using the LLM model.
+
+        ``image_path`` may also be a list of photos of the same package (front, back, side), which are
+        sent together in one request; pass the result to package_ocr_data to reconcile it into one medicine.
+        Failures are logged and return None, or are re-raised with ``raise_errors``.
+        """
+        try:
+            with self.metrics.timer("ocr"):
+                return self._extract(image_path)
+
+        except Exception as e:
+            logging.error(f"Failed to extract medicine information: {e}")
+            if raise_errors:
+                raise
+            return None
+
+    async def aextract_medicine_info(self, image_path, raise_errors=False):
+        """Async counterpart of extract_medicine_info using the model's ainvoke."""
+        try:
+            with self.metrics.timer("ocr"):
+                return await self._aextract(image_path)
 
         except Exception as e:
             logging.error(f"Failed to extract medicine information: {e}")
+            if raise_errors:
+                raise
             return None
 
 # if __name__ == "__main__":
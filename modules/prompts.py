@@ -3,6 +3,11 @@ You are a medicine OCR model. Extract the following details from the image. Incl
 Don't add information that is not present in image.
 """
 
+OCR_MULTI_IMAGE_PROMPT="""
+The images are different photos (e.g. front, back and sides) of the same medicine package. Combine what they 
+show into a single medicine.
+"""
+
 INFO_PROMPT="""
 You are a medical AI assistant specializing in pharmacology and clinical medicine. Based on the attched structured 
 data about a medicine, provide detailed information in the specified format.
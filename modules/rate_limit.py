@@ -0,0 +1,234 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes: lower values are served first
+INTERACTIVE = 0
+BATCH = 1
+
+_TRANSIENT_ERRORS = {"APIConnectionError", "APITimeoutError", "InternalServerError", "ServiceUnavailableError"}
+
+
+def estimate_tokens(text, completion_tokens=500):
+    """Rough token estimate for a request: ~4 characters per prompt token plus the expected completion."""
+    return len(str(text)) // 4 + completion_tokens
+
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_rate_limit_error(error):
+    return _status_code(error) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def is_transient_error(error):
+    status = _status_code(error)
+    return (
+        type(error).__name__ in _TRANSIENT_ERRORS
+        or isinstance(error, (TimeoutError, ConnectionError))
+        or (status is not None and status >= 500)
+    )
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Refills ``rate`` units per second up to ``capacity``; consumption may go negative to repay actual usage."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self.level -= amount
+
+
+class LLMScheduler:
+    """Shared gate for every OpenAI call: rate limits, retries, adaptive concurrency and priority lanes.
+
+    Requests and tokens per minute are enforced with token buckets. Calls wait in a priority queue,
+    so INTERACTIVE callers (chat) are admitted before queued BATCH callers (ingestion), and the last
+    ``interactive_reserve`` concurrency slots are kept free for interactive calls. The concurrency
+    limit halves on every rate-limit error and grows by one after a limit's worth of successes.
+    Rate-limit and transient errors are retried with full-jitter exponential backoff, honouring
+    Retry-After (capped at ``max_delay``) when the error carries it.
+    """
+
+    def __init__(self, requests_per_minute=500, tokens_per_minute=200000, max_concurrency=16, min_concurrency=1,
+                 interactive_reserve=1, max_retries=5, base_delay=1.0, max_delay=60.0, metrics=None):
+        self.requests = TokenBucket(requests_per_minute / 60, requests_per_minute / 60 * 10 or 1)
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute / 60 * 10 or 1)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = max_concurrency
+        self.interactive_reserve = interactive_reserve
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = metrics or REGISTRY
+        self.active = 0
+        self._successes = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _try_admit(self, ticket, tokens):
+        """Admit ``ticket`` if it heads the queue and capacity allows; otherwise return seconds to wait."""
+        priority = ticket[0]
+        limit = self.concurrency
+        if priority != INTERACTIVE and limit > self.interactive_reserve:
+            limit -= self.interactive_reserve
+        if self._waiting[0] is not ticket or self.active >= limit:
+            return 0.05
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+        if wait > 0:
+            return wait
+        heapq.heappop(self._waiting)
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+        self.active += 1
+        return 0.0
+
+    def _enqueue(self, priority):
+        ticket = (priority, next(self._sequence))
+        heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def acquire(self, priority=BATCH, tokens=1000):
+        with self._condition:
+            ticket = self._enqueue(priority)
+            while (wait := self._try_admit(ticket, tokens)) > 0:
+                self._condition.wait(wait)
+
+    async def aacquire(self, priority=BATCH, tokens=1000):
+        with self._condition:
+            ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_admit(ticket, tokens)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            with self._condition:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._condition.notify_all()
+            raise
+
+    def release(self, succeeded=True, throttled=False, estimated_tokens=0, used_tokens=None):
+        with self._condition:
+            self.active -= 1
+            if used_tokens is not None:
+                self.tokens.consume(used_tokens - estimated_tokens)
+            if throttled:
+                self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+                self._successes = 0
+                logger.warning(f"Rate limited, concurrency reduced to {self.concurrency}")
+            elif succeeded:
+                self._successes += 1
+                if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+                    self.concurrency += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+    def _backoff(self, attempt, error):
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _should_retry(self, error, attempt):
+        throttled = is_rate_limit_error(error)
+        retry = (throttled or is_transient_error(error)) and attempt < self.max_retries
+        if retry:
+            self.metrics.inc("pillbuddy_llm_retries_total", reason="rate_limit" if throttled else "transient")
+        return throttled, retry
+
+    @staticmethod
+    def _used_tokens(response):
+        usage = getattr(response, "usage_metadata", None) or {}
+        return usage.get("total_tokens")
+
+    def _failed(self, error, attempt, outcome):
+        """Record a failed attempt in ``outcome`` (the release arguments); return the retry delay or None."""
+        throttled, retry = self._should_retry(error, attempt)
+        outcome["throttled"] = throttled
+        if not retry:
+            return None
+        delay = self._backoff(attempt, error)
+        logger.warning(f"LLM call failed ({error}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    def call(self, fn, *args, priority=BATCH, tokens=1000, **kwargs):
+        """Run ``fn(*args, **kwargs)`` under the scheduler, retrying rate-limit and transient errors."""
+        for attempt in itertools.count():
+            self.acquire(priority, tokens)
+            # The slot is released however the call ends, including KeyboardInterrupt
+            outcome = {"succeeded": False}
+            try:
+                response = fn(*args, **kwargs)
+                outcome = {"estimated_tokens": tokens, "used_tokens": self._used_tokens(response)}
+                return response
+            except Exception as e:
+                delay = self._failed(e, attempt, outcome)
+                if delay is None:
+                    raise
+            finally:
+                self.release(**outcome)
+            time.sleep(delay)
+
+    async def acall(self, fn, *args, priority=BATCH, tokens=1000, **kwargs):
+        """Async counterpart of call for a coroutine function such as ``llm.ainvoke``."""
+        for attempt in itertools.count():
+            await self.aacquire(priority, tokens)
+            # The slot is released however the call ends, including cancellation of the awaiting task
+            outcome = {"succeeded": False}
+            try:
+                response = await fn(*args, **kwargs)
+                outcome = {"estimated_tokens": tokens, "used_tokens": self._used_tokens(response)}
+                return response
+            except Exception as e:
+                delay = self._failed(e, attempt, outcome)
+                if delay is None:
+                    raise
+            finally:
+                self.release(**outcome)
+            await asyncio.sleep(delay)
+
+
+# Shared scheduler used by components that are not given their own
+SCHEDULER = LLMScheduler()
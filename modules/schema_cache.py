@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Below this count langchain_neo4j samples a label's property values exhaustively rather than from a subset
+EXHAUSTIVE_SEARCH_LIMIT = 10000
+
+
+def graph_fingerprint(graph):
+    """Label and relationship-type counts plus property keys, read from the count store without scanning."""
+    labels = [record["label"] for record in graph.query("CALL db.labels() YIELD label RETURN label")]
+    types = [record["relationshipType"] for record in graph.query(
+        "CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType"
+    )]
+    property_keys = sorted(record["propertyKey"] for record in graph.query(
+        "CALL db.propertyKeys() YIELD propertyKey RETURN propertyKey"
+    ))
+
+    counts = [f"MATCH (n:`{label}`) RETURN 'label' AS kind, '{label}' AS name, count(n) AS count" for label in labels]
+    counts += [f"MATCH ()-[r:`{rel_type}`]->() RETURN 'relationship' AS kind, '{rel_type}' AS name, count(r) AS count"
+               for rel_type in types]
+    fingerprint = {"labels": {}, "relationships": {}, "property_keys": property_keys}
+    if counts:
+        for record in graph.query(" UNION ALL ".join(counts)):
+            bucket = "labels" if record["kind"] == "label" else "relationships"
+            fingerprint[bucket][record["name"]] = record["count"]
+    return fingerprint
+
+
+def drifted_names(cached, current, max_drift=0.1):
+    """Labels and relationship types (``{"labels": [...], "relationships": [...]}``) whose count drifted past
+    ``max_drift``, or None if the label, type or property-key sets differ and the whole schema is stale."""
+    if cached is None or cached["property_keys"] != current["property_keys"]:
+        return None
+    drifted = {}
+    for bucket in ("labels", "relationships"):
+        if cached[bucket].keys() != current[bucket].keys():
+            return None
+        drifted[bucket] = [
+            name for name, count in current[bucket].items()
+            if abs(count - cached[bucket][name]) > max_drift * max(cached[bucket][name], 1)
+        ]
+    return drifted
+
+
+def fingerprints_compatible(cached, current, max_drift=0.1):
+    """True if both fingerprints have the same labels, types and property keys and no count drifted past ``max_drift``."""
+    drifted = drifted_names(cached, current, max_drift)
+    return drifted is not None and not any(drifted.values())
+
+
+def _schema_formatter():
+    try:
+        from langchain_neo4j.graphs.neo4j_graph import _format_schema
+        return _format_schema
+    except ImportError:
+        pass
+    try:
+        from neo4j_graphrag.schema import format_schema
+        return format_schema
+    except ImportError:
+        return None
+
+
+def resample_schema(graph, drifted, fingerprint):
+    """Re-sample the enhanced property statistics of only the ``drifted`` labels and relationship types.
+
+    Updates ``graph.structured_schema`` in place and rebuilds ``graph.schema`` from it. Returns False,
+    leaving the graph untouched, if the installed langchain_neo4j lacks the sampling helpers; the
+    caller then falls back to ``graph.refresh_schema()``.
+    """
+    enhanced_cypher = getattr(graph, "_enhanced_schema_cypher", None)
+    format_schema = _schema_formatter()
+    if enhanced_cypher is None or format_schema is None:
+        return False
+    for bucket, props_key, is_relationship in (("labels", "node_props", False), ("relationships", "rel_props", True)):
+        for name in drifted[bucket]:
+            properties = graph.structured_schema.get(props_key, {}).get(name)
+            if not properties:
+                continue
+            exhaustive = fingerprint[bucket][name] < EXHAUSTIVE_SEARCH_LIMIT
+            try:
+                info = graph.query(enhanced_cypher(name, properties, exhaustive, is_relationship=is_relationship))[0]["output"]
+            except Exception as e:
+                logger.warning(f"Failed to re-sample schema of {name}: {e}")
+                continue
+            for prop in properties:
+                base = {"property": prop["property"], "type": prop["type"]}
+                prop.clear()
+                prop.update(base, **info.get(base["property"], {}))
+    graph.schema = format_schema(graph.structured_schema, True)
+    return True
+
+
+class SchemaSnapshotCache:
+    """On-disk copy of a Neo4jGraph's computed schema, reused while the graph's fingerprint is compatible.
+
+    A cached schema stays valid while the label, relationship-type and property-key sets are unchanged
+    and no label or relationship count has drifted by more than ``max_drift`` (relative) since the
+    schema was sampled.
+    """
+
+    def __init__(self, path, max_drift=0.1):
+        self.path = path
+        self.max_drift = max_drift
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as snapshot_file:
+                return json.load(snapshot_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable schema snapshot {self.path}: {e}")
+            return None
+
+    def save(self, fingerprint, structured_schema, schema):
+        # A unique temporary file per writer, so concurrent saves never write to or replace each other's file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as snapshot_file:
+                json.dump(
+                    {"fingerprint": fingerprint, "structured_schema": structured_schema, "schema": schema},
+                    snapshot_file,
+                    default=str,
+                )
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        logger.info(f"Schema snapshot written to {self.path}")
+
+    def is_compatible(self, cached, current):
+        return fingerprints_compatible(cached, current, self.max_drift)
@@ -0,0 +1,358 @@
+import array
+import json
+import logging
+import math
+import mmap
+import os
+import sys
+import tempfile
+import threading
+import time
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PBSNAP01"
+NULL = 0xFFFFFFFF
+
+# Per-medicine string properties, stored as one row of string ids per medicine
+SCALAR_FIELDS = ("brand_name", "generic_name", "manufacturer", "power_mg", "max_daily_dosage", "mechanism_description")
+
+# Per-medicine string lists, stored as CSR adjacency arrays (offsets + string ids)
+LIST_FIELDS = ("uses", "side_effects", "overdose_effects", "with_what_to_take", "before_or_after_food",
+               "detailed_steps", "storage_conditions", "shelf_life")
+
+
+def _flatten(values):
+    return [value for values_or_value in values or [] if values_or_value not in (None, "")
+            for value in (values_or_value if isinstance(values_or_value, list) else [values_or_value])
+            if value not in (None, "")]
+
+
+def write_snapshot(path, records):
+    """Write medicine records (rows of ALL_MEDICINE_DETAILS_QUERY) to a snapshot file, atomically.
+
+    Every distinct string is stored once in a string table. Each medicine's scalar properties are
+    a row of string ids, and each relationship family is an adjacency array: ``offsets[i]`` to
+    ``offsets[i + 1]`` index the string ids (and parallel values) of medicine ``i``'s neighbours.
+    """
+    strings = {}
+
+    def intern(value):
+        if value in (None, ""):
+            return NULL
+        return strings.setdefault(str(value), len(strings))
+
+    sections = {"scalars": array.array("I")}
+    for field in LIST_FIELDS + ("ingredients", "drug_interactions"):
+        sections[f"{field}.offsets"] = array.array("I", [0])
+        sections[f"{field}.targets"] = array.array("I")
+    sections["ingredients.composition_mg"] = array.array("d")
+    sections["drug_interactions.interaction_type"] = array.array("I")
+    sections["drug_interactions.effects"] = array.array("I")
+
+    for record in records:
+        medicine = {**record["medicine"], "max_daily_dosage": record.get("max_daily_dosage"),
+                    "mechanism_description": record.get("mechanism_description")}
+        sections["scalars"].extend(intern(medicine.get(field)) for field in SCALAR_FIELDS)
+        for field in LIST_FIELDS:
+            targets = sections[f"{field}.targets"]
+            targets.extend(intern(value) for value in _flatten(record.get(field)))
+            sections[f"{field}.offsets"].append(len(targets))
+        for ingredient in record.get("ingredients") or []:
+            sections["ingredients.targets"].append(intern(ingredient.get("name")))
+            composition = ingredient.get("composition_mg")
+            sections["ingredients.composition_mg"].append(math.nan if composition is None else float(composition))
+        sections["ingredients.offsets"].append(len(sections["ingredients.targets"]))
+        for interaction in record.get("drug_interactions") or []:
+            sections["drug_interactions.targets"].append(intern(interaction.get("drug_name")))
+            sections["drug_interactions.interaction_type"].append(intern(interaction.get("interaction_type")))
+            sections["drug_interactions.effects"].append(intern(interaction.get("effects")))
+        sections["drug_interactions.offsets"].append(len(sections["drug_interactions.targets"]))
+
+    encoded = [value.encode("utf-8") for value in strings]
+    string_offsets = array.array("I", [0])
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+    sections["string_offsets"] = string_offsets
+    sections["string_data"] = array.array("B", b"".join(encoded))
+
+    # Sections are 8-byte aligned after the header so they can be cast straight out of the mapping
+    directory, offset, blobs = {}, 0, []
+    for name, values in sections.items():
+        blob = values.tobytes()
+        directory[name] = [values.typecode, offset, len(values)]
+        blobs.append(blob + b"\0" * (-len(blob) % 8))
+        offset += len(blobs[-1])
+    header = json.dumps({
+        "byteorder": sys.byteorder, "medicines": len(sections["scalars"]) // len(SCALAR_FIELDS),
+        "strings": len(strings), "sections": directory,
+    }).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + 4 + len(header)) % 8)
+
+    # A unique temporary file per writer, so concurrent writers never truncate or replace each other's file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as snapshot_file:
+            snapshot_file.write(MAGIC)
+            snapshot_file.write(len(header).to_bytes(4, "little"))
+            snapshot_file.write(header)
+            for blob in blobs:
+                snapshot_file.write(blob)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    logger.info(f"Wrote graph snapshot of {len(sections['scalars']) // len(SCALAR_FIELDS)} medicines "
+                f"and {len(strings)} strings to {path}")
+
+
+class GraphSnapshot:
+    """Read-only view of a snapshot file. Arrays are memory-mapped; only the name index is built on load."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as snapshot_file:
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a graph snapshot")
+        header_len = int.from_bytes(self._mmap[len(MAGIC):len(MAGIC) + 4], "little")
+        start = len(MAGIC) + 4
+        header = json.loads(self._mmap[start:start + header_len])
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written on a {header['byteorder']}-endian machine")
+        base = start + header_len
+        view = memoryview(self._mmap)
+        self._sections = {
+            name: view[base + offset:base + offset + count * array.array(typecode).itemsize].cast(typecode)
+            for name, (typecode, offset, count) in header["sections"].items()
+        }
+        self.medicine_count = header["medicines"]
+        self.string_count = header["strings"]
+
+        self._index = {}
+        for medicine in range(self.medicine_count):
+            for field in ("brand_name", "generic_name"):
+                name = self._scalar(medicine, field)
+                if name:
+                    medicines = self._index.setdefault(name.lower(), [])
+                    if medicine not in medicines[-1:]:
+                        medicines.append(medicine)
+
+    def string(self, string_id):
+        if string_id == NULL:
+            return None
+        offsets = self._sections["string_offsets"]
+        return bytes(self._sections["string_data"][offsets[string_id]:offsets[string_id + 1]]).decode("utf-8")
+
+    def _scalar(self, medicine, field):
+        return self.string(self._sections["scalars"][medicine * len(SCALAR_FIELDS) + SCALAR_FIELDS.index(field)])
+
+    def _range(self, field, medicine):
+        offsets = self._sections[f"{field}.offsets"]
+        return range(offsets[medicine], offsets[medicine + 1])
+
+    def _list(self, field, medicine):
+        targets = self._sections[f"{field}.targets"]
+        return [self.string(targets[position]) for position in self._range(field, medicine)]
+
+    def names(self):
+        """Lower-cased brand and generic names of every medicine."""
+        return list(self._index)
+
+    def lookup(self, name):
+        """Indices of the medicines whose brand or generic name is ``name`` (case-insensitive)."""
+        return self._index.get(str(name).lower(), [])
+
+    def _label(self, medicine):
+        return self._scalar(medicine, "brand_name") or self._scalar(medicine, "generic_name")
+
+    def ingredients(self, medicine):
+        compositions = self._sections["ingredients.composition_mg"]
+        targets = self._sections["ingredients.targets"]
+        return [
+            {"name": self.string(targets[position]),
+             "composition_mg": None if math.isnan(compositions[position]) else compositions[position]}
+            for position in self._range("ingredients", medicine)
+        ]
+
+    def drug_interactions(self, medicine):
+        targets = self._sections["drug_interactions.targets"]
+        types = self._sections["drug_interactions.interaction_type"]
+        effects = self._sections["drug_interactions.effects"]
+        return [
+            {"drug_name": self.string(targets[position]), "interaction_type": self.string(types[position]),
+             "effects": self.string(effects[position])}
+            for position in self._range("drug_interactions", medicine)
+        ]
+
+    def uses(self, name):
+        return [use for medicine in self.lookup(name) for use in self._list("uses", medicine)]
+
+    def side_effects(self, name):
+        return [effect for medicine in self.lookup(name) for effect in self._list("side_effects", medicine)]
+
+    def dosage(self, name):
+        return [
+            {"medicine": self._label(medicine), "max_daily_dosage": self._scalar(medicine, "max_daily_dosage"),
+             "overdose_effects": self._list("overdose_effects", medicine)}
+            for medicine in self.lookup(name)
+        ]
+
+    def interactions(self, name):
+        return [
+            {"medicine": self._label(medicine), **interaction}
+            for medicine in self.lookup(name) for interaction in self.drug_interactions(medicine)
+        ]
+
+    def find_medicine_data(self, generic_name):
+        """Same result as MedicineDataImporter.find_medicine_data, served from the snapshot."""
+        results = []
+        for medicine in self.lookup(generic_name):
+            if (self._scalar(medicine, "generic_name") or "").lower() != str(generic_name).lower():
+                continue
+            with_what_to_take = self._list("with_what_to_take", medicine)
+            before_or_after_food = self._list("before_or_after_food", medicine)
+            shelf_life = self._list("shelf_life", medicine)
+            results.append({
+                **{field: self._scalar(medicine, field) for field in ("generic_name", "brand_name", "manufacturer", "power_mg")},
+                "ingredients": self.ingredients(medicine),
+                "uses": self._list("uses", medicine),
+                "dosage_guidelines": {
+                    "max_daily_dosage": self._scalar(medicine, "max_daily_dosage"),
+                    "overdose_effects": self._list("overdose_effects", medicine) or None,
+                },
+                "administration_instructions": {
+                    "with_what_to_take": with_what_to_take or None,
+                    "before_or_after_food": before_or_after_food[0] if before_or_after_food else None,
+                },
+                "mechanism_of_action": {
+                    "description": self._scalar(medicine, "mechanism_description"),
+                    "detailed_steps": self._list("detailed_steps", medicine),
+                },
+                "side_effects": self._list("side_effects", medicine),
+                "drug_interactions": self.drug_interactions(medicine),
+                "storage_and_shelf_life": {
+                    "storage_conditions": self._list("storage_conditions", medicine) or None,
+                    "shelf_life": shelf_life[0] if shelf_life else None,
+                },
+            })
+        return results
+
+    def template_rows(self, intent, params):
+        """Rows shaped like the matching cypher_templates query returns, or None for an unknown intent."""
+        rows = []
+        for medicine in self.lookup(params["name"]):
+            label = self._label(medicine)
+            if intent == "uses":
+                rows += [{"medicine": label, "use": use} for use in self._list("uses", medicine)]
+            elif intent == "side_effects":
+                rows += [{"medicine": label, "side_effect": effect} for effect in self._list("side_effects", medicine)]
+            elif intent == "interactions":
+                rows += [{"medicine": label, **interaction} for interaction in self.drug_interactions(medicine)]
+            elif intent == "interaction_pair":
+                other = params["other"]
+                other_ingredients = {ingredient["name"].lower() for candidate in self.lookup(other)
+                                     for ingredient in self.ingredients(candidate) if ingredient["name"]}
+                rows += [{"medicine": label, **interaction} for interaction in self.drug_interactions(medicine)
+                         if (interaction["drug_name"] or "").lower() in other_ingredients | {other}]
+            elif intent == "dosage":
+                max_daily_dosage = self._scalar(medicine, "max_daily_dosage")
+                overdose_effects = self._list("overdose_effects", medicine)
+                if max_daily_dosage or overdose_effects:
+                    rows.append({"medicine": label, "max_daily_dosage": max_daily_dosage,
+                                 "overdose_effects": overdose_effects})
+            elif intent == "administration":
+                before_or_after_food = self._list("before_or_after_food", medicine)
+                with_what_to_take = self._list("with_what_to_take", medicine)
+                if before_or_after_food or with_what_to_take:
+                    rows.append({"medicine": label, "before_or_after_food": before_or_after_food,
+                                 "with_what_to_take": with_what_to_take})
+            elif intent == "ingredients":
+                rows += [{"medicine": label, "ingredient": ingredient["name"], "composition_mg": ingredient["composition_mg"]}
+                         for ingredient in self.ingredients(medicine)]
+            elif intent == "storage":
+                storage_conditions = self._list("storage_conditions", medicine)
+                shelf_life = self._list("shelf_life", medicine)
+                if storage_conditions or shelf_life:
+                    rows.append({"medicine": label, "storage_conditions": storage_conditions, "shelf_life": shelf_life})
+            else:
+                return None
+        return rows
+
+
+class SnapshotStore:
+    """Serves lookups from the latest snapshot at ``path``, hot-reloading it when the file is replaced.
+
+    The file is stat'ed at most every ``check_interval`` seconds; register ``on_import`` as an import
+    listener to reload immediately in the importing process. Readers keep the snapshot they started
+    with, so a reload never disturbs a lookup in progress.
+    """
+
+    def __init__(self, path, check_interval=1.0, metrics=None):
+        self.path = path
+        self.check_interval = check_interval
+        self.metrics = metrics or REGISTRY
+        self._snapshot = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _stat_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def reload(self, force=True):
+        """Map the snapshot file again if it changed (or always with ``force``). Returns True if reloaded."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            signature = self._stat_signature()
+            if signature is None or (signature == self._signature and not force):
+                return False
+            self._snapshot = GraphSnapshot(self.path)
+            self._signature = signature
+        self.metrics.inc("pillbuddy_snapshot_reloads_total")
+        logger.info(f"Loaded graph snapshot with {self._snapshot.medicine_count} medicines from {self.path}")
+        return True
+
+    @property
+    def snapshot(self):
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.reload(force=False)
+        return self._snapshot
+
+    def on_import(self, names):
+        """Import listener: pick up the snapshot the importer just exported."""
+        self.reload(force=False)
+
+    def names(self):
+        snapshot = self.snapshot
+        return snapshot.names() if snapshot else []
+
+    def uses(self, name):
+        snapshot = self.snapshot
+        return snapshot.uses(name) if snapshot else []
+
+    def side_effects(self, name):
+        snapshot = self.snapshot
+        return snapshot.side_effects(name) if snapshot else []
+
+    def dosage(self, name):
+        snapshot = self.snapshot
+        return snapshot.dosage(name) if snapshot else []
+
+    def interactions(self, name):
+        snapshot = self.snapshot
+        return snapshot.interactions(name) if snapshot else []
+
+    def find_medicine_data(self, generic_name):
+        snapshot = self.snapshot
+        return snapshot.find_medicine_data(generic_name) if snapshot else []
+
+    def template_rows(self, intent, params):
+        snapshot = self.snapshot
+        return snapshot.template_rows(intent, params) if snapshot else None
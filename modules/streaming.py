@@ -0,0 +1,220 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from .ocr_data import package_ocr_data
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+
+_DONE = object()
+
+
+async def watch_directory(directory, poll_interval=1.0, settle=1.0, extensions=IMAGE_EXTENSIONS, stop_event=None):
+    """Yield image paths in ``directory``, existing ones first, then new ones as they appear.
+
+    A file is yielded once its modification time is at least ``settle`` seconds old, so partially
+    written uploads are skipped until they are complete. Runs until ``stop_event`` is set.
+    """
+    seen = set()
+    while stop_event is None or not stop_event.is_set():
+        now = time.time()
+        for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+            if entry.path in seen or not entry.is_file() or not entry.name.lower().endswith(extensions):
+                continue
+            if now - entry.stat().st_mtime < settle:
+                continue
+            seen.add(entry.path)
+            yield entry.path
+        await asyncio.sleep(poll_interval)
+
+
+async def read_stdin():
+    """Yield one image path per non-empty line of standard input."""
+    while True:
+        line = await asyncio.to_thread(sys.stdin.readline)
+        if not line:
+            return
+        if line.strip():
+            yield line.strip()
+
+
+def _path_from_jsonl(line):
+    record = json.loads(line)
+    if isinstance(record, str):
+        return record
+    return record.get("image_paths") or record.get("image_path") or record.get("path") or record.get("image")
+
+
+async def read_jsonl(path, follow=False, poll_interval=1.0):
+    """Yield image paths from a JSONL queue of strings or objects with an ``image_path`` key.
+
+    Objects may instead carry ``image_paths``, a list of photos of one package that are extracted together.
+
+    With ``follow=True`` the file is tailed like ``tail -f`` and new lines are picked up as they are appended.
+    """
+    with open(path, "r", encoding="utf-8") as queue_file:
+        while True:
+            line = queue_file.readline()
+            if not line:
+                if not follow:
+                    return
+                await asyncio.sleep(poll_interval)
+                continue
+            if not line.strip():
+                continue
+            try:
+                image_path = _path_from_jsonl(line)
+            except ValueError as e:
+                logger.error(f"Skipping malformed queue line: {e}")
+                continue
+            if image_path:
+                yield image_path
+
+
+async def iterate(paths):
+    """Adapt a plain iterable of paths into a source."""
+    for path in paths:
+        yield path
+
+
+class StreamingPipeline:
+    """Runs OCR, detail generation and import as overlapping stages joined by bounded queues.
+
+    Each queue holds at most ``queue_size`` items, so a slow stage pushes back on the ones before it.
+    The import stage groups finished medicines into shared transactions of up to ``import_batch_size``,
+    flushing early after ``import_flush_interval`` seconds without new work. ``on_result`` is called
+    with the same per-image dicts Pipeline.run_batch returns.
+    """
+
+    def __init__(self, pipeline, ocr_workers=4, enrichment_workers=4, queue_size=32, import_batch_size=50,
+                 import_flush_interval=1.0, on_result=None):
+        self.pipeline = pipeline
+        self.ocr_workers = ocr_workers
+        self.enrichment_workers = enrichment_workers
+        self.queue_size = queue_size
+        self.import_batch_size = import_batch_size
+        self.import_flush_interval = import_flush_interval
+        self.on_result = on_result
+        self.processed = 0
+        self.failed = 0
+
+    def _emit(self, image_path, result, error=None):
+        if error is None:
+            self.processed += 1
+        else:
+            self.failed += 1
+            logger.error(f"{image_path}: {error}")
+        self.pipeline.metrics.inc("pillbuddy_stream_images_total", status="ok" if error is None else "error")
+        if self.on_result is not None:
+            self.on_result({"image_path": image_path, "result": result, "error": error})
+
+    async def _stage(self, workers, next_queue, next_consumers):
+        await asyncio.gather(*workers)
+        for _ in range(next_consumers):
+            await next_queue.put(_DONE)
+
+    async def _produce(self, source, ocr_queue):
+        async for image_path in source:
+            await ocr_queue.put(image_path)
+        for _ in range(self.ocr_workers):
+            await ocr_queue.put(_DONE)
+
+    async def _ocr_worker(self, ocr_queue, enrichment_queue):
+        while (image_path := await ocr_queue.get()) is not _DONE:
+            try:
+                tool_calls = await self.pipeline.ocr_extractor.aextract_medicine_info(image_path, raise_errors=True)
+            except Exception as e:
+                self._emit(image_path, None, f"OCR extraction failed: {e}")
+                continue
+            medicine_info = package_ocr_data(image_path, tool_calls)
+            if not medicine_info:
+                self._emit(image_path, None, "OCR extraction returned no result")
+                continue
+            await enrichment_queue.put((image_path, medicine_info[0]))
+
+    async def _enrichment_worker(self, enrichment_queue, import_queue):
+        while (item := await enrichment_queue.get()) is not _DONE:
+            image_path, medicine_info = item
+            try:
+                medicine_data = await self.pipeline.details_extractor.agenerate_medicine_info(
+                    medicine_info, raise_errors=True
+                )
+            except Exception as e:
+                self._emit(image_path, None, f"Detail generation failed: {e}")
+                continue
+            if not medicine_data:
+                self._emit(image_path, None, "Detail generation returned no result")
+                continue
+            await import_queue.put((image_path, medicine_data))
+
+    async def _import(self, batch):
+        data_creator = await self.pipeline.adata_creator()
+        await asyncio.to_thread(data_creator.import_medicines_data, [medicine_data for _, medicine_data in batch])
+
+    async def _flush(self, batch):
+        """Import ``batch`` in one transaction; if that fails, retry its images one by one so that a
+        single bad medicine only fails its own image, with its own error."""
+        if not batch:
+            return
+        try:
+            await self._import(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                self._emit(batch[0][0], None, f"Import failed: {e}")
+            else:
+                logger.warning(f"Import of {len(batch)} medicines failed, retrying one at a time: {e}")
+                self.pipeline.metrics.inc("pillbuddy_stream_import_retries_total")
+                for item in batch:
+                    try:
+                        await self._import([item])
+                    except Exception as item_error:
+                        self._emit(item[0], None, f"Import failed: {item_error}")
+                    else:
+                        self._emit(*item)
+        else:
+            for image_path, medicine_data in batch:
+                self._emit(image_path, medicine_data)
+        batch.clear()
+
+    async def _import_worker(self, import_queue):
+        batch = []
+        while True:
+            try:
+                timeout = self.import_flush_interval if batch else None
+                item = await asyncio.wait_for(import_queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                await self._flush(batch)
+                continue
+            if item is _DONE:
+                break
+            batch.append(item)
+            if len(batch) >= self.import_batch_size:
+                await self._flush(batch)
+        await self._flush(batch)
+
+    async def run(self, source):
+        """Consume an async iterable of image paths until it is exhausted; returns (processed, failed)."""
+        ocr_queue = asyncio.Queue(self.queue_size)
+        enrichment_queue = asyncio.Queue(self.queue_size)
+        import_queue = asyncio.Queue(self.queue_size)
+
+        await asyncio.gather(
+            self._produce(source, ocr_queue),
+            self._stage(
+                [self._ocr_worker(ocr_queue, enrichment_queue) for _ in range(self.ocr_workers)],
+                enrichment_queue,
+                self.enrichment_workers,
+            ),
+            self._stage(
+                [self._enrichment_worker(enrichment_queue, import_queue) for _ in range(self.enrichment_workers)],
+                import_queue,
+                1,
+            ),
+            self._import_worker(import_queue),
+        )
+        logger.info(f"Streaming run finished: {self.processed} processed, {self.failed} failed")
+        return self.processed, self.failed
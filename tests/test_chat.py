@@ -0,0 +1,54 @@
+from benchmarks.fakes import FakeGraph, FakeQAChain
+from benchmarks.scenarios import details_record, synthetic_medicine
+from modules.chat import Neo4jQueryHandler
+from modules.metrics import MetricsRegistry
+from modules.snapshot import SnapshotStore, write_snapshot
+
+
+class ImportingGraph(FakeGraph):
+    """FakeGraph whose Medicine nodes carry the imported_at stamp MedicineDataImporter sets."""
+
+    def __init__(self, medicines):
+        super().__init__(medicines)
+        self.now = 1000
+        self.imported_at = {}
+
+    def imported(self, args, uses):
+        self.now += 1
+        args["uses"] = uses
+        self.imported_at[args["brand_name"].lower()] = (args["generic_name"].lower(), self.now)
+
+    def query(self, query, params=None):
+        if "timestamp() AS now" in query:
+            return [{"now": self.now}]
+        if "m.imported_at > $since" in query:
+            return [{"brand_name": brand, "generic_name": generic, "imported_at": stamp}
+                    for brand, (generic, stamp) in self.imported_at.items() if stamp > params["since"]]
+        return super().query(query, params)
+
+
+def test_imports_by_other_processes_invalidate_cached_results():
+    args = synthetic_medicine(1)[1]
+    graph = ImportingGraph([args])
+    handler = Neo4jQueryHandler(graph=graph, chain=FakeQAChain(), metrics=MetricsRegistry(), import_poll_interval=0)
+    question = f"What is {args['brand_name']} used for?"
+
+    assert "Headache" not in handler.query(question)["result"]
+    graph.imported(args, ["Headache"])
+    assert "Headache" in handler.query(question)["result"]
+
+    # An import already picked up is not reported again while it stays inside the overlap window
+    assert handler.poll_imports() == set()
+
+
+def test_medicines_missing_from_the_snapshot_are_answered_from_the_graph(tmp_path):
+    exported, imported = synthetic_medicine(1)[1], synthetic_medicine(2)[1]
+    path = str(tmp_path / "graph.snapshot")
+    write_snapshot(path, [details_record(exported)])
+    handler = Neo4jQueryHandler(graph=FakeGraph([exported, imported]), chain=FakeQAChain(),
+                                metrics=MetricsRegistry(), snapshot=SnapshotStore(path))
+
+    for args in (exported, imported):
+        result = handler.query(f"What is {args['brand_name']} used for?")["result"]
+        assert all(use in result for use in args["uses"])
+    assert handler.metrics.counter_value("pillbuddy_snapshot_queries_total", intent="uses") == 1
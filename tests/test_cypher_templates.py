@@ -0,0 +1,44 @@
+import pytest
+
+from modules.cypher_templates import CypherTemplateRouter
+
+NAMES = ["Dolo-650", "Paracetamol", "Crocin", "Warfarin", "Liver-52"]
+
+
+@pytest.fixture
+def router():
+    return CypherTemplateRouter(NAMES)
+
+
+@pytest.mark.parametrize("question, intent, params", [
+    ("What is Dolo-650 used for?", "uses", {"name": "dolo-650"}),
+    ("What is dolo-650 for?", "uses", {"name": "dolo-650"}),
+    ("Does Crocin treat fever", "uses", {"name": "crocin"}),
+    ("What are the side effects of Crocin?", "side_effects", {"name": "crocin"}),
+    ("What is the maximum dose of Paracetamol?", "dosage", {"name": "paracetamol"}),
+    ("Can I take Dolo-650 with Warfarin?", "interaction_pair", {"name": "dolo-650", "other": "warfarin"}),
+    ("Which drugs interact with Crocin?", "interactions", {"name": "crocin"}),
+    ("Should I take Crocin before or after food?", "administration", {"name": "crocin"}),
+    ("What is in Crocin?", "ingredients", {"name": "crocin"}),
+    ("How should I store Dolo-650?", "storage", {"name": "dolo-650"}),
+    ("What is Liver-52 used for?", "uses", {"name": "liver-52"}),
+])
+def test_routes_recognised_questions(router, question, intent, params):
+    template, routed_params = router.route(question)
+    assert (template.intent, routed_params) == (intent, params)
+
+
+@pytest.mark.parametrize("question", [
+    "What dose of Dolo-650 is safe for a 5 year old child?",
+    "Is Dolo-650 good for a pregnant woman?",
+    "How many Dolo-650 can I take if I have liver disease?",
+    "Can I take Crocin while breastfeeding?",
+    "What is the dose of Paracetamol for elderly patients with kidney problems?",
+    "Is Crocin safe?",
+    "What is the price of Dolo-650?",
+    "What is the difference between Dolo-650 and Crocin?",
+    "What is Dolo-650?",
+    "Tell me about aspirin",
+])
+def test_falls_back_to_the_chain(router, question):
+    assert router.route(question) is None
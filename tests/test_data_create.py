@@ -0,0 +1,124 @@
+import copy
+
+import pytest
+
+from benchmarks.fakes import RecordingDriver
+from benchmarks.scenarios import synthetic_medicine
+from modules.data_create import MEDICINE_QUERIES, MedicineDataImporter
+from modules.metrics import MetricsRegistry
+
+FAMILY_QUERIES = {query: family for family, query in MEDICINE_QUERIES}
+
+
+class Graph:
+    """Records the import statements and answers STORED_HASHES_QUERY from what was stored before."""
+
+    def __init__(self):
+        self.statements = []
+        self.hashes = {}
+        self.driver = RecordingDriver(responder=self.respond)
+
+    def respond(self, query, params):
+        self.statements.append((query, params))
+        if "RETURN brand_name, m.content_hash" in query:
+            return [{"brand_name": name, **self.hashes[name]} for name in params["brand_names"] if name in self.hashes]
+        if "SET m.content_hash" in query:
+            for row in params["rows"]:
+                self.hashes[row["brand_name"]] = {"content_hash": row["content_hash"], "family_hashes": row["family_hashes"]}
+        return []
+
+    def rows(self, family):
+        return [row for query, params in self.statements if FAMILY_QUERIES.get(query) == family for row in params["rows"]]
+
+    def clear(self):
+        self.statements.clear()
+
+
+def _importer(graph):
+    return MedicineDataImporter(driver=graph.driver, normaliser=False, metrics=MetricsRegistry())
+
+
+def _payload(args):
+    return [{"name": "MedicineDetailedInfo", "args": args}]
+
+
+def test_null_merge_keys_are_dropped_per_row():
+    graph = Graph()
+    args = synthetic_medicine(1)[1]
+    args.update(manufacturer=None, power_mg=None, uses=args["uses"] + [None])
+    args["dosage_guidelines"]["max_daily_dosage"] = None
+    args["drug_interactions"].append({"drug_name": None, "interaction_type": None, "effects": None})
+
+    _importer(graph).import_medicine_data(_payload(args))
+
+    assert graph.rows("medicine") == [{"generic_name": "Genericol-1", "brand_name": "Brandex-1",
+                                      "manufacturer": None, "power_mg": None}]
+    assert None not in graph.rows("uses")[0]["items"]
+    assert graph.rows("dosage_guidelines") == []
+    assert all(item["drug_name"] for item in graph.rows("drug_interactions")[0]["items"])
+
+
+def test_medicine_without_brand_name_is_rejected():
+    graph = Graph()
+    args = {**synthetic_medicine(1)[1], "brand_name": None}
+
+    with pytest.raises(ValueError, match="Genericol-1"):
+        _importer(graph).import_medicines_data([_payload(synthetic_medicine(2)[1]), _payload(args)])
+    assert graph.statements == []
+
+
+def test_changed_interaction_is_written_to_the_relationship():
+    graph = Graph()
+    importer = _importer(graph)
+    args = synthetic_medicine(1)[1]
+    importer.import_medicine_data(_payload(args))
+
+    changed = copy.deepcopy(args)
+    changed["drug_interactions"][0].update(interaction_type="Severe", effects="Serotonin syndrome")
+    graph.clear()
+    importer.import_medicine_data(_payload(changed))
+
+    [row] = graph.rows("drug_interactions")
+    assert row["items"][0]["effects"] == "Serotonin syndrome"
+    query = dict(MEDICINE_QUERIES)["drug_interactions"]
+    assert "SET r.interaction_type = item.interaction_type, r.effects = item.effects" in query
+    assert "ON CREATE" not in query
+
+
+@pytest.mark.parametrize("parent_family, family, parent", [
+    ("dosage_guidelines", "overdose_effects", "DosageGuideline"),
+    ("mechanism_of_action", "detailed_steps", "MechanismOfAction"),
+])
+def test_stale_children_of_per_medicine_parents_are_deleted(parent_family, family, parent):
+    graph = Graph()
+    importer = _importer(graph)
+    args = synthetic_medicine(1)[1]
+    importer.import_medicine_data(_payload(args))
+
+    changed = copy.deepcopy(args)
+    changed[parent_family][family] = ["Changed"]
+    graph.clear()
+    importer.import_medicine_data(_payload(changed))
+
+    deletes = [(query, params["brand_names"]) for query, params in graph.statements if "DELETE r" in query]
+    assert [brand_names for _, brand_names in deletes] == [["Brandex-1"], ["Brandex-1"]]
+    assert any(f"MATCH (:{parent} {{brand_name: brand_name}})" in query for query, _ in deletes)
+    assert graph.rows(parent_family) != []
+    assert graph.rows(family) == [{"brand_name": "Brandex-1", "items": ["Changed"]}]
+
+
+def test_failed_snapshot_export_does_not_fail_the_committed_import(tmp_path):
+    graph = Graph()
+    metrics = MetricsRegistry()
+    importer = MedicineDataImporter(driver=graph.driver, normaliser=False, metrics=metrics,
+                                    snapshot_path=str(tmp_path / "missing" / "graph.snapshot"))
+    notified = []
+    importer.add_import_listener(lambda names: 1 / 0)
+    importer.add_import_listener(notified.append)
+
+    with importer.deferred_snapshot():
+        importer.import_medicine_data(_payload(synthetic_medicine(1)[1]))
+    importer.import_medicines_data([_payload(synthetic_medicine(2)[1])])
+
+    assert notified == [{"brandex-1", "genericol-1"}, {"brandex-2", "genericol-2"}]
+    assert metrics.counter_value("pillbuddy_snapshot_export_errors_total") == 2
@@ -0,0 +1,33 @@
+import io
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from PIL import Image
+
+from modules.image_preprocess import ImagePreprocessor, detect_mime_type
+
+
+def _jpeg(size=(2000, 1000)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def test_large_image_is_shrunk():
+    processed = ImagePreprocessor(max_edge=500).process(_jpeg())
+    assert processed.mime_type == "image/jpeg"
+    assert processed.bytes_saved > 0
+    assert max(Image.open(io.BytesIO(processed.data)).size) == 500
+
+
+@pytest.mark.parametrize("image_bytes, mime_type", [
+    (b"\x00\x00\x00\x18ftypheic\x00\x00\x00\x00mif1heic", "image/heic"),
+    (_jpeg()[:600], "image/jpeg"),
+    (b"not an image", "image/jpeg"),
+])
+def test_undecodable_image_is_sent_as_is(image_bytes, mime_type):
+    processed = ImagePreprocessor().process(image_bytes)
+    assert processed.data == image_bytes
+    assert processed.mime_type == detect_mime_type(image_bytes) == mime_type
@@ -0,0 +1,56 @@
+import pytest
+
+from modules.cypher_templates import TEMPLATES
+from modules.interactions import ALL_INTERACTION_PROFILES_QUERY, INTERACTION_PROFILES_QUERY, InteractionChecker
+from modules.metrics import MetricsRegistry
+
+PROFILES = [
+    {"brand_name": "Warfex", "generic_name": "Warfarin", "ingredients": ["warfarin"],
+     "interactions": [{"drug_name": "Aspirin", "interaction_type": "Major", "effects": "Bleeding"},
+                      {"drug_name": "Paracetamol", "interaction_type": "Moderate", "effects": "Raised INR"}]},
+    {"brand_name": "Ecosprin", "generic_name": "Aspirin", "ingredients": ["aspirin"], "interactions": []},
+    {"brand_name": "Combiflam", "generic_name": "Ibuprofen and Paracetamol", "ingredients": ["ibuprofen", "paracetamol"],
+     "interactions": []},
+]
+
+
+def _query(cypher, params):
+    if cypher == ALL_INTERACTION_PROFILES_QUERY:
+        return [dict(profile) for profile in PROFILES]
+    assert cypher == INTERACTION_PROFILES_QUERY
+    return [{"name": name, **profile} for name in params["names"] for profile in PROFILES
+            if name in (profile["brand_name"].lower(), profile["generic_name"].lower())]
+
+
+@pytest.fixture(params=[False, True], ids=["graph", "index"])
+def checker(request):
+    return InteractionChecker(_query, use_index=request.param, metrics=MetricsRegistry())
+
+
+def test_pairwise_interaction(checker):
+    result = checker.check(["Warfarin", "ECOSPRIN"])
+    assert result["medicines"] == {"warfarin": ["Warfex"], "ecosprin": ["Ecosprin"]}
+    assert result["interactions"] == [{"medicine": "warfarin", "other": "ecosprin", "level": "medicine",
+                                       "drug_name": "Aspirin", "interaction_type": "Major", "effects": "Bleeding"}]
+
+
+def test_ingredient_level_interaction(checker):
+    result = checker.check(["Warfex", "Combiflam"])
+    assert [(entry["level"], entry["drug_name"], entry["effects"]) for entry in result["interactions"]] == [
+        ("ingredient", "Paracetamol", "Raised INR")
+    ]
+    assert result["shared_ingredients"] == []
+
+
+def test_unresolved_names(checker):
+    result = checker.check(["Warfex", "Unknownol", "", None])
+    assert result["unresolved"] == ["unknownol"]
+    assert result["medicines"] == {"warfex": ["Warfex"]} and result["interactions"] == []
+
+
+def test_interaction_details_are_read_from_the_relationship():
+    queries = [INTERACTION_PROFILES_QUERY] + [template.cypher for template in TEMPLATES
+                                              if template.intent in ("interaction_pair", "interactions")]
+    for query in queries:
+        assert "coalesce(r.interaction_type, di.interaction_type)" in query
+        assert "coalesce(r.effects, di.effects)" in query
@@ -0,0 +1,52 @@
+import pytest
+
+from modules.normalise import ENTITY_FAMILIES, FUZZY_CUTOFFS, EntityNormaliser
+from modules.metrics import MetricsRegistry
+
+EXISTING = {
+    "ingredients": ["Paracetamol", "Vitamin B1"],
+    "drug_interactions": ["Warfarin"],
+    "uses": ["Hepatitis B"],
+    "side_effects": ["Drowsiness"],
+    "overdose_effects": ["Liver damage"],
+    "storage_conditions": ["Store in a cool, dry place"],
+    "detailed_steps": ["Inhibits prostaglandin synthesis in the brain"],
+}
+
+
+@pytest.fixture
+def normaliser():
+    rows = [{"family": family, "name": name} for family, names in EXISTING.items() for name in names]
+    return EntityNormaliser(loader=lambda cypher, params: rows, metrics=MetricsRegistry())
+
+
+def test_every_family_has_a_cutoff():
+    assert set(FUZZY_CUTOFFS) == set(ENTITY_FAMILIES)
+
+
+@pytest.mark.parametrize("family, value", [
+    ("uses", "Hepatitis C"),
+    ("side_effects", "Drowsyness"),
+    ("overdose_effects", "Liver damages"),
+    ("storage_conditions", "Store in a cool, dark place"),
+    ("detailed_steps", "Inhibits prostaglandin synthesis in the body"),
+])
+def test_free_text_families_are_not_fuzzy_matched(normaliser, family, value):
+    assert normaliser.canonical(family, value) == value
+
+
+@pytest.mark.parametrize("family, value, canonical", [
+    ("ingredients", "Paracetamoll", "Paracetamol"),
+    ("drug_interactions", "warfarin.", "Warfarin"),
+    ("ingredients", "Paracetamol IP", "Paracetamol"),
+    ("ingredients", "acetaminophen", "Paracetamol"),
+    ("drug_interactions", "Coumadin", "Warfarin"),
+    ("side_effects", "feeling sick", "Nausea"),
+    ("storage_conditions", "store in a cool,  dry place.", "Store in a cool, dry place"),
+])
+def test_typos_grades_and_synonyms_resolve(normaliser, family, value, canonical):
+    assert normaliser.canonical(family, value) == canonical
+
+
+def test_fuzzy_match_requires_equal_numbers_and_letters(normaliser):
+    assert normaliser.canonical("ingredients", "Vitamin B2") == "Vitamin B2"
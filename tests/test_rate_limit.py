@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from modules.metrics import MetricsRegistry
+from modules.rate_limit import BATCH, INTERACTIVE, LLMScheduler
+
+
+class TransientError(ConnectionError):
+    pass
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("rate limited")
+        self.response = type("Response", (), {"headers": {"retry-after": str(retry_after)}})()
+
+
+def _scheduler(**kwargs):
+    options = {"requests_per_minute": 600000, "tokens_per_minute": 10 ** 9, "max_concurrency": 2,
+               "interactive_reserve": 1, "base_delay": 0.0, "max_delay": 0.01, "metrics": MetricsRegistry()}
+    return LLMScheduler(**{**options, **kwargs})
+
+
+def test_batch_calls_leave_the_interactive_reserve_free():
+    scheduler = _scheduler()
+
+    async def run():
+        gate = asyncio.Event()
+        first = asyncio.create_task(scheduler.acall(gate.wait, priority=BATCH))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(scheduler.acall(gate.wait, priority=BATCH))
+        await asyncio.sleep(0.1)
+        assert scheduler.active == 1 and not second.done()
+
+        async def answer():
+            return "answer"
+
+        assert await asyncio.wait_for(scheduler.acall(answer, priority=INTERACTIVE), 1) == "answer"
+        gate.set()
+        await asyncio.wait_for(asyncio.gather(first, second), 1)
+
+    asyncio.run(run())
+    assert scheduler.active == 0
+
+
+def test_queued_interactive_call_is_admitted_before_queued_batch_call():
+    scheduler = _scheduler(max_concurrency=1, interactive_reserve=0)
+    order = []
+
+    async def run():
+        gate = asyncio.Event()
+        holder = asyncio.create_task(scheduler.acall(gate.wait))
+        await asyncio.sleep(0.01)
+
+        async def record(name):
+            order.append(name)
+
+        batch = asyncio.create_task(scheduler.acall(record, "batch", priority=BATCH))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(scheduler.acall(record, "interactive", priority=INTERACTIVE))
+        await asyncio.sleep(0.01)
+        gate.set()
+        await asyncio.wait_for(asyncio.gather(holder, batch, interactive), 1)
+
+    asyncio.run(run())
+    assert order == ["interactive", "batch"]
+
+
+def test_cancelled_call_releases_its_slot():
+    scheduler = _scheduler(max_concurrency=1, interactive_reserve=0)
+
+    async def run():
+        call = asyncio.create_task(scheduler.acall(asyncio.sleep, 10))
+        await asyncio.sleep(0.01)
+        assert scheduler.active == 1
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        assert scheduler.active == 0
+
+        async def answer():
+            return "answer"
+
+        assert await asyncio.wait_for(scheduler.acall(answer, priority=BATCH), 1) == "answer"
+
+    asyncio.run(run())
+    assert scheduler.active == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = _scheduler(max_concurrency=1, interactive_reserve=0)
+
+    async def run():
+        gate = asyncio.Event()
+        holder = asyncio.create_task(scheduler.acall(gate.wait))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(scheduler.acall(gate.wait))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        gate.set()
+        await asyncio.wait_for(holder, 1)
+
+    asyncio.run(run())
+    assert scheduler.active == 0 and scheduler._waiting == []
+
+
+def test_failed_calls_release_and_transient_errors_retry():
+    scheduler = _scheduler(max_retries=2)
+    attempts = []
+
+    def flaky():
+        attempts.append(scheduler.active)
+        if len(attempts) < 3:
+            raise TransientError("connection reset")
+        return "ok"
+
+    assert scheduler.call(flaky) == "ok"
+    assert attempts == [1, 1, 1] and scheduler.active == 0
+
+    def broken():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        scheduler.call(broken)
+    assert scheduler.active == 0
+
+
+def test_rate_limit_halves_concurrency_and_caps_retry_after():
+    scheduler = _scheduler(max_concurrency=4, max_retries=0)
+
+    def throttled():
+        raise RateLimitError(120)
+
+    with pytest.raises(RateLimitError):
+        scheduler.call(throttled)
+    assert scheduler.concurrency == 2 and scheduler.active == 0
+    assert scheduler._backoff(0, RateLimitError(120)) == scheduler.max_delay
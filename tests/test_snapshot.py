@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from benchmarks.scenarios import details_record, synthetic_medicine
+from modules.data_create import MedicineDataImporter
+from modules.snapshot import GraphSnapshot, SnapshotStore, write_snapshot
+
+
+def _records(count=5):
+    records = [details_record(synthetic_medicine(index)[1]) for index in range(count)]
+    # A second brand of the first generic, and a medicine with every optional field empty
+    records.append({**records[0], "medicine": {**records[0]["medicine"], "brand_name": "Otherbrand"}})
+    records.append({
+        "medicine": {"generic_name": "Sparsol", "brand_name": "Sparse", "manufacturer": None, "power_mg": None},
+        "ingredients": [{"name": "Sparsol", "composition_mg": None}],
+        "uses": [], "max_daily_dosage": None, "overdose_effects": [], "with_what_to_take": [],
+        "before_or_after_food": [], "mechanism_description": None, "detailed_steps": [], "side_effects": [],
+        "drug_interactions": [], "storage_conditions": [], "shelf_life": [],
+    })
+    return records
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    records = _records()
+    path = str(tmp_path / "graph.snapshot")
+    write_snapshot(path, records)
+    return GraphSnapshot(path), records
+
+
+def test_find_medicine_data_matches_graph_lookup(snapshot):
+    graph_snapshot, records = snapshot
+    for generic_name in {record["medicine"]["generic_name"] for record in records}:
+        expected = [MedicineDataImporter._record_to_args(record) for record in records
+                    if record["medicine"]["generic_name"] == generic_name]
+        assert graph_snapshot.find_medicine_data(generic_name.upper()) == expected
+
+
+def test_template_rows(snapshot):
+    graph_snapshot, records = snapshot
+    record = records[1]
+    name = record["medicine"]["brand_name"].lower()
+    label = record["medicine"]["brand_name"]
+
+    assert graph_snapshot.template_rows("uses", {"name": name}) == [
+        {"medicine": label, "use": use} for use in record["uses"]
+    ]
+    assert graph_snapshot.template_rows("side_effects", {"name": name}) == [
+        {"medicine": label, "side_effect": effect} for effect in record["side_effects"]
+    ]
+    assert graph_snapshot.template_rows("interactions", {"name": name}) == [
+        {"medicine": label, **interaction} for interaction in record["drug_interactions"]
+    ]
+    assert graph_snapshot.template_rows("dosage", {"name": name}) == [
+        {"medicine": label, "max_daily_dosage": record["max_daily_dosage"],
+         "overdose_effects": record["overdose_effects"]}
+    ]
+    assert graph_snapshot.template_rows("ingredients", {"name": name}) == [
+        {"medicine": label, "ingredient": ingredient["name"], "composition_mg": ingredient["composition_mg"]}
+        for ingredient in record["ingredients"]
+    ]
+    assert graph_snapshot.template_rows("administration", {"name": name}) == [
+        {"medicine": label, "before_or_after_food": record["before_or_after_food"],
+         "with_what_to_take": record["with_what_to_take"][0]}
+    ]
+    assert graph_snapshot.template_rows("storage", {"name": name}) == [
+        {"medicine": label, "storage_conditions": record["storage_conditions"], "shelf_life": record["shelf_life"]}
+    ]
+    drug_name = record["drug_interactions"][0]["drug_name"]
+    assert graph_snapshot.template_rows("interaction_pair", {"name": name, "other": drug_name.lower()}) == [
+        {"medicine": label, **record["drug_interactions"][0]}
+    ]
+    assert graph_snapshot.template_rows("unknown", {"name": name}) is None
+
+
+def test_generic_name_resolves_every_brand(snapshot):
+    graph_snapshot, records = snapshot
+    rows = graph_snapshot.template_rows("uses", {"name": records[0]["medicine"]["generic_name"].lower()})
+    assert {row["medicine"] for row in rows} == {"Brandex-0", "Otherbrand"}
+
+
+def test_sparse_medicine_yields_no_optional_rows(snapshot):
+    graph_snapshot, _ = snapshot
+    for intent in ("uses", "dosage", "administration", "storage", "interactions"):
+        assert graph_snapshot.template_rows(intent, {"name": "sparse"}) == []
+    assert graph_snapshot.ingredients(graph_snapshot.lookup("sparse")[0]) == [
+        {"name": "Sparsol", "composition_mg": None}
+    ]
+
+
+def test_store_reloads_replaced_file(tmp_path):
+    path = str(tmp_path / "graph.snapshot")
+    records = _records(2)
+    write_snapshot(path, records[:1])
+    store = SnapshotStore(path, check_interval=3600)
+    assert store.uses("brandex-1") == []
+
+    write_snapshot(path, records)
+    store.on_import({"brandex-1"})
+    assert store.uses("brandex-1") == records[1]["uses"]
+    assert os.listdir(tmp_path) == ["graph.snapshot"]